@@ -0,0 +1,106 @@
+############################################# fixtures.py ##############################################
+#                                                                                                      #
+#                                 Recorded games for the benchmarks, and a requests adapter that       #
+#                                 serves them in place of the NHL API and HTML reports, so a           #
+#                                 benchmark run never touches the network.                             #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import contextlib
+import gzip
+import json
+import os
+import re
+import requests
+from requests.adapters import BaseAdapter
+from scraper import http_client
+from scraper.throttle import RequestScheduler
+############################################# Config ###################################################
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# One game per code path we care about. The keys are the names the benchmark reports under
+FIXTURES = {"regular": {"game_id": 2023020350, "game_type": 2, "about": "Regular season game, decided in regulation"},
+            "playoff_ot": {"game_id": 2023030111, "game_type": 3, "about": "Playoff game decided in the 2nd OT (game_type 3)"},
+            "shootout": {"game_id": 2023020412, "game_type": 2, "about": "Regular season game decided in a shootout (add_shootout_logic)"},
+            "no_goals": {"game_id": 2023020513, "game_type": 2, "about": "Game without a goal. No play has the assist or scorer fields, so their columns come from the fixed schema (game_json.py)"}}
+# Fixture file for each kind of request
+FILE_NAMES = {"play-by-play": "play-by-play.json.gz", "landing": "landing.json.gz", "html-report": "report.htm.gz"}
+GAMECENTER_RE = re.compile(r"/gamecenter/(\d+)/(play-by-play|landing)")
+HTML_REPORT_RE = re.compile(r"/htmlreports/(\d{8})/PL0(\d+)\.HTM")
+
+# Function to get the path of one of a game's fixture files
+def fixture_path(game_id, kind):
+    return os.path.join(FIXTURE_DIR, str(game_id), FILE_NAMES[kind])
+
+# Function to save a game's responses as fixtures. Files are gzipped, the html reports are big
+def save_fixture(game_id, play_by_play, landing, html_doc):
+    os.makedirs(os.path.join(FIXTURE_DIR, str(game_id)), exist_ok=True)
+    bodies = {"play-by-play": json.dumps(play_by_play), "landing": json.dumps(landing), "html-report": html_doc}
+    for kind, body in bodies.items():
+        # mtime=0 so re-saving the same game gives the same bytes
+        with open(fixture_path(game_id, kind), "wb") as f:
+            f.write(gzip.compress(body.encode("utf-8"), mtime=0))
+
+# Function to load a game's fixtures. Returns kind -> response body
+def load_fixture(game_id):
+    bodies = {}
+    for kind in FILE_NAMES:
+        with open(fixture_path(game_id, kind), "rb") as f:
+            bodies[kind] = gzip.decompress(f.read()).decode("utf-8")
+    return bodies
+
+# Function to record a real game as a fixture. Needs the network, the benchmark itself doesn't
+def record(game_id):
+    from scraper.nhl_pbp_data_scraper import fetch_game
+    payloads = fetch_game(game_id)
+    if payloads is None:
+        raise RuntimeError("Couldn't fetch game {}".format(game_id))
+    save_fixture(game_id, payloads["play-by-play"], payloads["landing"], payloads["html-report"])
+
+# Adapter that answers requests from the fixture files instead of the network. Anything without a fixture is a 404
+class FixtureAdapter(BaseAdapter):
+    def __init__(self, game_ids):
+        super().__init__()
+        self.games = {int(game_id): load_fixture(game_id) for game_id in game_ids}
+        # Html report urls only have the season and the end of the game id
+        self.html_reports = {str(game_id)[5:]: bodies["html-report"] for game_id, bodies in self.games.items()}
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        body = None
+        match = GAMECENTER_RE.search(request.url)
+        if match and int(match.group(1)) in self.games:
+            body = self.games[int(match.group(1))][match.group(2)]
+        match = HTML_REPORT_RE.search(request.url)
+        if match:
+            body = self.html_reports.get(match.group(2))
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        response.status_code = 200 if body is not None else 404
+        response._content = body.encode("utf-8") if body is not None else b""
+        return response
+
+    def close(self):
+        pass
+
+# Context manager that points the scraper's shared session at the fixtures for the duration of the block, with
+# the on-disk cache and the rate limits turned off. Yields the adapter
+@contextlib.contextmanager
+def replay(game_ids):
+    adapter = FixtureAdapter(game_ids)
+    fixture_session = requests.Session()
+    fixture_session.mount("https://", adapter)
+    fixture_session.mount("http://", adapter)
+    old_session, old_cache, old_scheduler = http_client.session, http_client.cache, http_client.scheduler
+    http_client.set_session(fixture_session)
+    http_client.cache = None
+    http_client.set_scheduler(RequestScheduler(host_rates={}, default_rate=(None, None)))
+    try:
+        yield adapter
+    finally:
+        http_client.set_session(old_session)
+        http_client.cache = old_cache
+        http_client.set_scheduler(old_scheduler)
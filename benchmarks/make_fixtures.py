@@ -0,0 +1,312 @@
+########################################## make_fixtures.py ############################################
+#                                                                                                      #
+#                                 Builds the synthetic benchmark games in benchmarks/fixtures. Each    #
+#                                 game is laid out like the real play-by-play json, landing json and   #
+#                                 HTML report, with a fixed seed so the files come out the same every  #
+#                                 time. Run with python -m benchmarks.make_fixtures                    #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import random
+from .fixtures import FIXTURES, save_fixture
+############################################# Config ###################################################
+SEASON = 20232024
+HOME = {"id": 10, "abbrev": "TOR"}
+AWAY = {"id": 8, "abbrev": "MTL"}
+FIRST_NAMES = ["John", "Auston", "Mitch", "William", "Morgan", "Joel", "James", "Nick", "Cole", "Jake", "Ryan", "Max",
+               "Tyler", "David", "Connor", "Brady", "Sam", "Alex", "Mark", "Evan", "Kyle", "Adam", "Ilya", "Joseph"]
+# A few multi word last names, since those trip up the html description parsing
+LAST_NAMES = ["Tavares", "Matthews", "Marner", "Nylander", "Rielly", "Eriksson Ek", "van Riemsdyk", "Suzuki", "Caufield",
+              "Robertson", "Evans", "Poehling", "Domi", "Bertuzzi", "Kampf", "Brodie", "Tkachuk", "Reinhart", "Pietrangelo",
+              "Stone", "Bouchard", "Connor", "Fox", "Samsonov", "Woll"]
+POSITION_TITLES = {"C": "Center", "L": "Left Wing", "R": "Right Wing", "D": "Defense", "G": "Goalie"}
+# html events whose description has its spaces written as &nbsp; on the real report
+NBSP_EVENTS = ["FAC", "HIT", "BLOCK", "SHOT", "GIVE", "TAKE"]
+HTML_HEADER = ('<tr class="heading"><td class="heading + bborder" width="5%">#</td><td class="heading + bborder">Per</td>'
+               '<td class="heading + bborder">Str</td><td class="heading + bborder">Time:<br>Elapsed<br>Game</td>'
+               '<td class="heading + bborder">Event</td><td class="heading + bborder">Description</td>'
+               '<td class="heading + bborder">MTL On Ice</td><td class="heading + rborder + bborder">TOR On Ice</td></tr>')
+
+# Function to make a team's 20 man roster in the rosterSpots format. Names come from the player id, so a player
+# has the same name in every fixture game
+def make_roster(team_id, rng, first_player_id):
+    numbers = rng.sample(range(2, 99), 20)
+    positions = ["C"] * 4 + ["L"] * 4 + ["R"] * 4 + ["D"] * 6 + ["G"] * 2
+    players = []
+    for i, position in enumerate(positions):
+        first_name, last_name = player_name(first_player_id + i)
+        players.append({"teamId": team_id, "playerId": first_player_id + i, "firstName": {"default": first_name},
+                        "lastName": {"default": last_name}, "sweaterNumber": numbers[i], "positionCode": position, "headshot": ""})
+    return players
+
+# Function to get the (first, last) name that goes with a player id
+def player_name(player_id):
+    rng = random.Random(player_id)
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+def full_name(player):
+    return (player["firstName"]["default"] + " " + player["lastName"]["default"]).upper()
+
+def last_name(player):
+    return player["lastName"]["default"].upper()
+
+# Function to make the html for an on ice cell, one font element per player
+def on_ice_cell(players):
+    if not players:
+        return '<td class=" + bborder">&nbsp;</td>'
+    cells = []
+    for player in players:
+        cells.append('<td align="center"><table cellpadding="0" cellspacing="0" border="0"><tr><td align="center">'
+                     '<font style="cursor:hand;" title="{} - {}">{}</font></td></tr><tr><td align="center">{}</td></tr></table></td>'
+                     '<td align="center" class="bold">&nbsp;</td>'.format(POSITION_TITLES[player["positionCode"]], full_name(player),
+                                                                         player["sweaterNumber"], player["positionCode"]))
+    return '<td class=" + bborder"><table cellpadding="0" cellspacing="0" border="0"><tr>{}</tr></table></td>'.format("".join(cells))
+
+# Builds one game. Events are added to the api plays and the html rows at the same time, so the two line up
+# the way they do on a real game
+class GameBuilder:
+    def __init__(self, game_id, game_type, seed):
+        self.game_id = game_id
+        self.game_type = game_type
+        self.rng = random.Random(seed)
+        self.rosters = {"TOR": make_roster(HOME["id"], self.rng, 8470000), "MTL": make_roster(AWAY["id"], self.rng, 8480000)}
+        self.team_ids = {"TOR": HOME["id"], "MTL": AWAY["id"]}
+        self.score = {"TOR": 0, "MTL": 0}
+        # Only let the trailing team (or either, when tied) score, so the game stays within a goal. Used for the
+        # shootout game, which has to be tied after regulation
+        self.keep_close = False
+        self.plays = []
+        self.html_rows = []
+
+    def period_length(self, period_type):
+        return 300 if period_type == "OT" and self.game_type != 3 else 1200
+
+    # Function to pick who is on the ice for a team. The goalie is always last
+    def on_ice(self, team, skaters=5):
+        roster = self.rosters[team]
+        return self.rng.sample([p for p in roster if p["positionCode"] != "G"], skaters) + [p for p in roster if p["positionCode"] == "G"][:1]
+
+    def coords(self):
+        return {"xCoord": self.rng.randint(-99, 99), "yCoord": self.rng.randint(-42, 42), "zoneCode": self.rng.choice(["O", "D", "N"])}
+
+    # Function to add an event. api=False / html=False leave it off one of the sources
+    def add(self, period, seconds, period_type, key, code, details, html_event, description, situation="1551",
+            away_ice=None, home_ice=None, api=True, html=True, strength="EV"):
+        minutes, secs = divmod(seconds, 60)
+        remaining = self.period_length(period_type) - seconds
+        if api:
+            sort_order = len(self.plays) + 1
+            self.plays.append({"eventId": sort_order + 50, "period": period,
+                               "periodDescriptor": {"number": period, "periodType": period_type},
+                               "timeInPeriod": "{:02d}:{:02d}".format(minutes, secs),
+                               "timeRemaining": "{:02d}:{:02d}".format(*divmod(remaining, 60)),
+                               "situationCode": situation, "homeTeamDefendingSide": "left" if period % 2 else "right",
+                               "typeCode": code, "typeDescKey": key, "sortOrder": sort_order * 10, "details": details})
+        if html:
+            if html_event in NBSP_EVENTS:
+                description = description.replace(" ", "&nbsp;")
+            self.html_rows.append('<tr class="evenColor"><td align="center" class=" + bborder">{}</td><td class=" + bborder" align="center">{}</td>'
+                                  '<td class=" + bborder" align="center">{}</td><td class=" + bborder" align="center">{}:{:02d}<br>{}:{:02d}</td>'
+                                  '<td class=" + bborder" align="center">{}</td><td class=" + bborder">{}</td>{}{}</tr>'.format(
+                                      len(self.html_rows) + 1, period, "&nbsp;" if html_event == "PSTR" else strength, minutes, secs,
+                                      remaining // 60, remaining % 60, html_event, description, on_ice_cell(away_ice), on_ice_cell(home_ice)))
+
+    # Function to add one random event during play. Returns the event key
+    def add_random_event(self, period, seconds, period_type, penalty, allow_goals):
+        rng = self.rng
+        away_skaters = 4 if penalty == "MTL" else 5
+        home_skaters = 4 if penalty == "TOR" else 5
+        situation = "1{}{}1".format(away_skaters, home_skaters)
+        strength = "EV" if away_skaters == home_skaters else "PP"
+        away_ice = self.on_ice("MTL", away_skaters)
+        home_ice = self.on_ice("TOR", home_skaters)
+        ice = {"MTL": away_ice, "TOR": home_ice}
+        team = rng.choice(["TOR", "MTL"])
+        opponent = "MTL" if team == "TOR" else "TOR"
+        player = rng.choice(ice[team][:-1])
+        other = rng.choice(ice[opponent][:-1])
+        team_id = self.team_ids[team]
+        zone = rng.choice(["Off.", "Def.", "Neu."])
+        args = (situation, away_ice, home_ice)
+        roll = rng.random()
+        if roll < 0.2:
+            # The away player is always listed first on the html report
+            away_player = rng.choice(away_ice[:-1])
+            home_player = rng.choice(home_ice[:-1])
+            winner, loser = (home_player, away_player) if team == "TOR" else (away_player, home_player)
+            details = dict(self.coords(), eventOwnerTeamId=team_id, winningPlayerId=winner["playerId"], losingPlayerId=loser["playerId"])
+            description = "{} won {} Zone - MTL #{} {} vs TOR #{} {}".format(team, zone, away_player["sweaterNumber"], last_name(away_player),
+                                                                             home_player["sweaterNumber"], last_name(home_player))
+            self.add(period, seconds, period_type, "faceoff", 502, details, "FAC", description, *args, strength=strength)
+            return "faceoff"
+        if roll < 0.33:
+            details = dict(self.coords(), eventOwnerTeamId=team_id, hittingPlayerId=player["playerId"], hitteePlayerId=other["playerId"])
+            description = "{} #{} {} HIT {} #{} {}, {} Zone".format(team, player["sweaterNumber"], last_name(player), opponent,
+                                                                  other["sweaterNumber"], last_name(other), zone)
+            self.add(period, seconds, period_type, "hit", 503, details, "HIT", description, *args, strength=strength)
+            return "hit"
+        if roll < 0.5:
+            details = dict(self.coords(), eventOwnerTeamId=team_id, shotType="wrist", shootingPlayerId=player["playerId"],
+                           goalieInNetId=ice[opponent][-1]["playerId"])
+            description = "{} ONGOAL - #{} {}, Wrist, Off. Zone, {} ft.".format(team, player["sweaterNumber"], last_name(player), rng.randint(5, 60))
+            self.add(period, seconds, period_type, "shot-on-goal", 506, details, "SHOT", description, *args, strength=strength)
+            return "shot-on-goal"
+        if roll < 0.6:
+            key = "missed-shot" if rng.random() < 0.9 else "failed-shot-attempt"
+            details = dict(self.coords(), eventOwnerTeamId=team_id, shotType="snap", shootingPlayerId=player["playerId"], reason="wide-of-net")
+            description = "{} #{} {}, Snap, Wide of Net, Off. Zone, {} ft.".format(team, player["sweaterNumber"], last_name(player), rng.randint(5, 60))
+            self.add(period, seconds, period_type, key, 507, details, "MISS", description, *args, strength=strength)
+            return key
+        if roll < 0.7:
+            details = dict(self.coords(), eventOwnerTeamId=self.team_ids[opponent], blockingPlayerId=other["playerId"],
+                           shootingPlayerId=player["playerId"], reason="blocked")
+            description = "{} #{} {} OPPONENT-BLOCKED BY {} #{} {}, Wrist, Def. Zone".format(team, player["sweaterNumber"], last_name(player),
+                                                                                        opponent, other["sweaterNumber"], last_name(other))
+            self.add(period, seconds, period_type, "blocked-shot", 508, details, "BLOCK", description, *args, strength=strength)
+            return "blocked-shot"
+        if roll < 0.83:
+            key, code, html_event, word = ("giveaway", 504, "GIVE", "GIVEAWAY") if roll < 0.77 else ("takeaway", 525, "TAKE", "TAKEAWAY")
+            details = dict(self.coords(), eventOwnerTeamId=team_id, playerId=player["playerId"])
+            description = "{} {} - #{} {}, {} Zone".format(team, word, player["sweaterNumber"], last_name(player), zone)
+            self.add(period, seconds, period_type, key, code, details, html_event, description, *args, strength=strength)
+            return key
+        if roll < 0.86 and penalty is None and period_type == "REG":
+            if rng.random() < 0.2:
+                # Bench minor, served by a player
+                details = dict(self.coords(), eventOwnerTeamId=team_id, typeCode="BEN", descKey="too-many-men-on-the-ice",
+                               duration=2, servedByPlayerId=player["playerId"])
+                description = "{} TEAM Too many men/ice - bench(2 min) Served By: #{} {}, Neu. Zone".format(team, player["sweaterNumber"], last_name(player))
+            else:
+                details = dict(self.coords(), eventOwnerTeamId=team_id, typeCode="MIN", descKey="hooking", duration=2,
+                               committedByPlayerId=player["playerId"], drawnByPlayerId=other["playerId"])
+                description = "{} #{} {} Hooking(2 min), Def. Zone Drawn By: {} #{} {}".format(team, player["sweaterNumber"], last_name(player),
+                                                                                          opponent, other["sweaterNumber"], last_name(other))
+            self.add(period, seconds, period_type, "penalty", 509, details, "PENL", description, *args, strength=strength)
+            return "penalty:" + team
+        if roll < 0.9 and allow_goals and not (self.keep_close and self.score[team] > self.score[opponent]):
+            self.add_goal(period, seconds, period_type, team, player, *rng.sample([p for p in ice[team][:-1] if p is not player], 2),
+                          situation=situation, away_ice=away_ice, home_ice=home_ice, strength=strength)
+            return "goal"
+        self.add(period, seconds, period_type, "stoppage", 516, {"reason": "icing"}, "STOP", "ICING", *args, strength=strength)
+        return "stoppage"
+
+    def add_goal(self, period, seconds, period_type, team, scorer, assist1, assist2, situation="1551", away_ice=None, home_ice=None, strength="EV"):
+        self.score[team] += 1
+        details = dict(self.coords(), eventOwnerTeamId=self.team_ids[team], shotType="wrist", scoringPlayerId=scorer["playerId"],
+                       assist1PlayerId=assist1["playerId"], assist2PlayerId=assist2["playerId"],
+                       homeScore=self.score["TOR"], awayScore=self.score["MTL"])
+        description = "{} #{} {}(3), Wrist, Off. Zone, 12 ft.<br>Assists: #{} {}(4); #{} {}(2)".format(
+            team, scorer["sweaterNumber"], last_name(scorer), assist1["sweaterNumber"], last_name(assist1), assist2["sweaterNumber"], last_name(assist2))
+        self.add(period, seconds, period_type, "goal", 505, details, "GOAL", description, situation, away_ice or self.on_ice("MTL"),
+                 home_ice or self.on_ice("TOR"), strength=strength)
+
+    # Function to play a period of random events. Returns the last event time
+    def play_period(self, period, period_type, allow_goals):
+        period_length = self.period_length(period_type)
+        self.add(period, 0, period_type, "period-start", 520, None, "PSTR", "Period Start- Local time: 7:23 EST",
+                 away_ice=self.on_ice("MTL"), home_ice=self.on_ice("TOR"))
+        seconds = 0
+        penalty = None
+        penalty_ends = 0
+        while True:
+            seconds += self.rng.randint(1, 14)
+            if seconds >= period_length - 1:
+                return min(seconds, period_length)
+            if penalty is not None and seconds >= penalty_ends:
+                penalty = None
+            event = self.add_random_event(period, seconds, period_type, penalty, allow_goals)
+            if event.startswith("penalty:"):
+                penalty = event.split(":")[1]
+                penalty_ends = seconds + 120
+            elif event == "goal":
+                penalty = None
+                # Sudden death
+                if period_type == "OT":
+                    return seconds
+
+    # Function to run a regular season shootout. Each team gets 3 shots and the last one always goes in if it's tied
+    def play_shootout(self):
+        goals = {"TOR": 0, "MTL": 0}
+        situation = "0101"
+        for i in range(6):
+            team = "MTL" if i % 2 == 0 else "TOR"
+            opponent = "TOR" if team == "MTL" else "MTL"
+            shooter = self.rosters[team][i // 2]
+            goalie = [p for p in self.rosters[opponent] if p["positionCode"] == "G"][0]
+            # Shooter only on ice for his team, goalie only for the other
+            situation = "0101" if team == "TOR" else "1010"
+            away_ice, home_ice = ([goalie], [shooter]) if team == "TOR" else ([shooter], [goalie])
+            details = dict(self.coords(), eventOwnerTeamId=self.team_ids[team], shotType="wrist")
+            if self.rng.random() < 0.5 or (i == 5 and goals["TOR"] == goals["MTL"]):
+                goals[team] += 1
+                details["scoringPlayerId"] = shooter["playerId"]
+                description = "{} #{} {}, Wrist, Off. Zone, 10 ft.".format(team, shooter["sweaterNumber"], last_name(shooter))
+                self.add(5, 0, "SO", "goal", 505, details, "GOAL", description, situation, away_ice, home_ice)
+            else:
+                details["shootingPlayerId"] = shooter["playerId"]
+                description = "{} ONGOAL - #{} {}, Wrist, Off. Zone, 10 ft.".format(team, shooter["sweaterNumber"], last_name(shooter))
+                self.add(5, 0, "SO", "shot-on-goal", 506, details, "SHOT", description, situation, away_ice, home_ice)
+        self.add(5, 0, "SO", "shootout-complete", 523, None, "SOC", "Shootout Completed", situation="0101")
+        self.add(5, 0, "SO", "game-end", 524, None, "GEND", "Game End- Local time: 10:03 EST", situation="0101")
+
+    # Function to play the whole game for one of the scenarios in FIXTURES
+    def play(self, scenario):
+        # Pre game rows are only on the html report
+        for event, description in [("PGSTR", "Pre-Game Start Time 7:11 EST"), ("PGEND", "Pre-Game End Time 7:20 EST"), ("ANTHEM", "Anthem Start Time 7:21 EST")]:
+            self.add(1, 0, "REG", None, None, None, event, description, api=False)
+        periods = [(1, "REG"), (2, "REG"), (3, "REG")]
+        if scenario == "playoff_ot":
+            periods += [(4, "OT"), (5, "OT")]
+        elif scenario == "shootout":
+            periods += [(4, "OT")]
+            self.keep_close = True
+        for period, period_type in periods:
+            # Shootout games have to be tied after regulation, and stay tied through OT
+            allow_goals = scenario != "no_goals" and not (scenario == "shootout" and period_type == "OT")
+            seconds = self.play_period(period, period_type, allow_goals)
+            away_ice, home_ice = self.on_ice("MTL"), self.on_ice("TOR")
+            if scenario == "shootout" and period == 3 and self.score["TOR"] != self.score["MTL"]:
+                # Down one, so a single late goal ties it
+                trailing, ice = ("TOR", home_ice) if self.score["TOR"] < self.score["MTL"] else ("MTL", away_ice)
+                seconds = min(seconds, self.period_length(period_type) - 2)
+                self.add_goal(period, seconds, period_type, trailing, *ice[:3], away_ice=away_ice, home_ice=home_ice)
+            if scenario == "playoff_ot" and period == periods[-1][0] and self.score["TOR"] == self.score["MTL"]:
+                # Playoff games can't end tied, so the home team wins it in the last OT
+                seconds = min(seconds, self.period_length(period_type) - 2)
+                self.add_goal(period, seconds, period_type, "TOR", *home_ice[:3], away_ice=away_ice, home_ice=home_ice)
+            if scenario == "playoff_ot" and period_type == "OT" and self.score["TOR"] != self.score["MTL"]:
+                self.add(period, seconds, period_type, "game-end", 524, None, "GEND", "Game End- Local time: 10:03 EST",
+                         away_ice=away_ice, home_ice=home_ice)
+                return
+            self.add(period, seconds, period_type, "period-end", 521, None, "PEND", "Period End- Local time: 8:03 EST",
+                     away_ice=away_ice, home_ice=home_ice)
+        if scenario == "shootout":
+            self.play_shootout()
+        else:
+            self.add(3, 1200, "REG", "game-end", 524, None, "GEND", "Game End- Local time: 10:03 EST")
+
+    # Function to get the game as (play-by-play json, landing json, html report)
+    def payloads(self):
+        game = {"id": self.game_id, "season": SEASON, "gameType": self.game_type, "gameDate": "2023-12-05", "gameState": "OFF",
+                "venue": {"default": "Scotiabank Arena"}}
+        play_by_play = dict(game, homeTeam=dict(HOME, score=self.score["TOR"]), awayTeam=dict(AWAY, score=self.score["MTL"]),
+                            plays=self.plays, rosterSpots=self.rosters["TOR"] + self.rosters["MTL"])
+        landing = dict(game, homeTeam={"abbrev": "TOR"}, awayTeam={"abbrev": "MTL"},
+                       summary={"gameInfo": {"homeTeam": {"headCoach": {"default": "Sheldon Keefe"}},
+                                             "awayTeam": {"headCoach": {"default": "Martin St. Louis"}}}})
+        # The real report starts a new table (and header row) every 40 or so rows
+        pages = []
+        for i in range(0, len(self.html_rows), 40):
+            pages.append('<table border="0" cellpadding="0" cellspacing="0" width="100%">' + HTML_HEADER + "\n".join(self.html_rows[i:i + 40]) + "</table>")
+        html_doc = ("<html><head><title>Play By Play</title></head><body>"
+                    '<table id="Visitor"><tr><td align="center" style="font-size: 10px;font-weight:bold">MONTREAL CANADIENS</td></tr></table>'
+                    + '<div class="page">'.join(pages) + "</body></html>")
+        return play_by_play, landing, html_doc
+
+if __name__ == "__main__":
+    for seed, (name, fixture) in enumerate(FIXTURES.items()):
+        builder = GameBuilder(fixture["game_id"], fixture["game_type"], seed)
+        builder.play(name)
+        save_fixture(fixture["game_id"], *builder.payloads())
+        print("{}: game {}, {} plays".format(name, fixture["game_id"], len(builder.plays)))
@@ -0,0 +1,228 @@
+################################################ run.py ################################################
+#                                                                                                      #
+#                                 Offline benchmark. Replays the fixture games through fetch_game and  #
+#                                 parse_game, timing each cleaning stage, and reports games/sec and    #
+#                                 peak memory per game. Results can be saved as a baseline and later   #
+#                                 runs are compared against it. The output of each game is checked     #
+#                                 against a reference that's kept in git. Run with                     #
+#                                 python -m benchmarks.run                                             #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from scraper import nhl_pbp_data_scraper as scraper
+from .fixtures import FIXTURES, replay
+############################################# Config ###################################################
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Row counts and column checksums of every fixture game's output. Unlike the baseline's timings these are the same on
+# every machine, so this one is committed
+DEFAULT_REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference.json")
+# Functions in the scraper module that get timed. Time spent in parse_game outside of these is reported as parse_game
+STAGES = ["fetch_game", "parse_game", "build_plays", "build_roster", "get_teams", "apply_misc_info", "clean_players",
+          "add_event_players", "add_event_team", "add_total_goals", "parse_situation_code", "add_elapsed_time",
+          "parse_html_report", "merge_html_report", "add_on_ice_ids", "add_shootout_logic", "clean_columns"]
+
+# Times the stages by swapping each function in the scraper module for a timed wrapper. Stages call each other
+# through the module, so nested calls are caught too. Each stage only gets the time spent in it, not in the
+# stages it calls
+class StageTimer:
+    def __init__(self, module, stages):
+        self.module = module
+        self.stages = stages
+        self.seconds = {stage: 0.0 for stage in stages}
+        # Time spent in timed children, for each stage currently running
+        self.child_seconds = []
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            self.child_seconds.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.seconds[stage] += elapsed - self.child_seconds.pop()
+                if self.child_seconds:
+                    self.child_seconds[-1] += elapsed
+        return timed
+
+    @contextlib.contextmanager
+    def patched(self):
+        originals = {stage: getattr(self.module, stage) for stage in self.stages}
+        for stage, function in originals.items():
+            setattr(self.module, stage, self.wrap(stage, function))
+        try:
+            yield self
+        finally:
+            for stage, function in originals.items():
+                setattr(self.module, stage, function)
+
+# Function to scrape a game from the fixtures with the scraper's output hidden
+def scrape_quietly(game_id):
+    with contextlib.redirect_stdout(io.StringIO()):
+        payloads = scraper.fetch_game(game_id)
+        return scraper.parse_game(payloads)
+
+# Function to get a checksum of each column of a df, as hex strings. Values and dtype both count, so a column
+# that changes type shows up too
+def column_checksums(pbp_df):
+    return {column: "{:016x}".format(int(pd.util.hash_pandas_object(pbp_df[column], index=False).sum()) & (2 ** 64 - 1))
+            for column in pbp_df.columns}
+
+# Function to get what a game's output should be checked on: its rows, columns and their checksums
+def game_output(pbp_df):
+    return {"rows": len(pbp_df), "dtypes": {column: str(dtype) for column, dtype in pbp_df.dtypes.items()},
+            "checksums": column_checksums(pbp_df)}
+
+# Function to run the benchmark. names are keys of FIXTURES. Every game is scraped once to warm up, then
+# repeat more times for the timings, then once more under tracemalloc for peak memory
+def run_benchmark(names, repeat=5):
+    game_ids = {name: FIXTURES[name]["game_id"] for name in names}
+    results = {"python": platform.python_version(), "pandas": pd.__version__, "repeat": repeat, "games": {}, "stages": {}, "outputs": {}}
+    timer = StageTimer(scraper, STAGES)
+    with replay(game_ids.values()):
+        for game_id in game_ids.values():
+            scrape_quietly(game_id)
+        total_seconds = 0.0
+        with timer.patched():
+            for name, game_id in game_ids.items():
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    pbp = scrape_quietly(game_id)
+                seconds = (time.perf_counter() - start) / repeat
+                total_seconds += seconds
+                results["games"][name] = {"game_id": game_id, "rows": len(pbp), "seconds": seconds}
+                results["outputs"][name] = game_output(pbp)
+        # Peak memory is measured on its own pass, tracemalloc slows everything down
+        for name, game_id in game_ids.items():
+            tracemalloc.start()
+            scrape_quietly(game_id)
+            results["games"][name]["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+    # Per game averages
+    runs = repeat * len(game_ids)
+    results["stages"] = {stage: seconds / runs for stage, seconds in timer.seconds.items()}
+    results["games_per_sec"] = len(game_ids) / total_seconds if total_seconds else 0.0
+    results["peak_mb"] = max(game["peak_mb"] for game in results["games"].values())
+    return results
+
+# Function to print the results, next to the baseline's when there is one
+def report(results, baseline=None):
+    def change(now, before):
+        if not before:
+            return ""
+        return "{:+.1f}%".format((now - before) / before * 100)
+
+    base_stages = baseline["stages"] if baseline else {}
+    base_games = baseline["games"] if baseline else {}
+    print("{:<22}{:>12}{:>12}{:>10}".format("stage (ms/game)", "now", "baseline", "change"))
+    for stage, seconds in results["stages"].items():
+        before = base_stages.get(stage)
+        print("{:<22}{:>12.2f}{:>12}{:>10}".format(stage, seconds * 1000, "{:.2f}".format(before * 1000) if before else "-", change(seconds, before)))
+    print()
+    print("{:<22}{:>8}{:>12}{:>12}{:>10}{:>12}".format("game", "rows", "ms", "baseline", "change", "peak MB"))
+    for name, game in results["games"].items():
+        before = base_games.get(name, {})
+        print("{:<22}{:>8}{:>12.1f}{:>12}{:>10}{:>12.1f}".format(name, game["rows"], game["seconds"] * 1000,
+                                                                "{:.1f}".format(before["seconds"] * 1000) if before else "-",
+                                                                change(game["seconds"], before.get("seconds")), game["peak_mb"]))
+        if before and before["rows"] != game["rows"]:
+            print("  rows changed from {} to {}".format(before["rows"], game["rows"]))
+    print()
+    print("games/sec: {:.2f}{}".format(results["games_per_sec"], " (baseline {:.2f}, {})".format(
+        baseline["games_per_sec"], change(results["games_per_sec"], baseline["games_per_sec"])) if baseline else ""))
+    print("peak memory: {:.1f} MB{}".format(results["peak_mb"], " (baseline {:.1f} MB)".format(baseline["peak_mb"]) if baseline else ""))
+
+# Function to find what got worse than the baseline. Games that got slower or used more memory by more than
+# tolerance (0.2 = 20%). Changes to the output are checked against the reference instead (see output_changes)
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, game in results["games"].items():
+        before = baseline["games"].get(name)
+        if before is None:
+            continue
+        if game["seconds"] > before["seconds"] * (1 + tolerance):
+            found.append("{}: {:.1f} ms, baseline {:.1f} ms".format(name, game["seconds"] * 1000, before["seconds"] * 1000))
+        if game["peak_mb"] > before["peak_mb"] * (1 + tolerance):
+            found.append("{}: peak {:.1f} MB, baseline {:.1f} MB".format(name, game["peak_mb"], before["peak_mb"]))
+    return found
+
+# Function to find the games whose output doesn't match the reference: rows, columns, dtypes or values
+def output_changes(results, reference):
+    found = []
+    for name, output in results["outputs"].items():
+        before = reference["games"].get(name)
+        if before is None:
+            continue
+        if output["rows"] != before["rows"]:
+            found.append("{}: rows changed from {} to {}".format(name, before["rows"], output["rows"]))
+        for column in before["checksums"]:
+            if column not in output["checksums"]:
+                found.append("{}: column {} is missing".format(name, column))
+            elif output["dtypes"][column] != before["dtypes"][column]:
+                found.append("{}: column {} changed type from {} to {}".format(name, column, before["dtypes"][column], output["dtypes"][column]))
+            elif output["checksums"][column] != before["checksums"][column]:
+                found.append("{}: column {} changed".format(name, column))
+        for column in output["checksums"]:
+            if column not in before["checksums"]:
+                found.append("{}: new column {}".format(name, column))
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Benchmark the scraper on the fixture games, offline")
+    parser.add_argument("--games", nargs="+", choices=list(FIXTURES), default=list(FIXTURES), help="fixture games to run (default all)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per game (default 5)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare against or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="save this run as the baseline")
+    parser.add_argument("--reference", default=DEFAULT_REFERENCE, help="output reference to check against or save to")
+    parser.add_argument("--save-reference", action="store_true", help="save this run's output as the reference, after an intended change")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if the output doesn't match the reference, or anything regressed past --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown / memory growth for --check (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.games, args.repeat)
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print("\nSaved baseline to {}".format(args.baseline))
+    changes = []
+    if args.save_reference:
+        with open(args.reference, "w") as f:
+            json.dump({"pandas": pd.__version__, "games": results["outputs"]}, f, indent=1, sort_keys=True)
+        print("Saved reference to {}".format(args.reference))
+    elif os.path.exists(args.reference):
+        with open(args.reference) as f:
+            changes = output_changes(results, json.load(f))
+        print("\noutput: {}".format("{} changes from the reference".format(len(changes)) if changes else "matches the reference"))
+        # --check prints them below
+        if not args.check:
+            for line in changes:
+                print("  " + line)
+    if args.check:
+        found = changes + (regressions(results, baseline, args.tolerance) if baseline is not None and not args.save_baseline else [])
+        for line in found:
+            print("REGRESSION " + line)
+        return 1 if found else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+############################################# __main__.py ##############################################
+#                                                                                                      #
+#                                 Lets the batch runner be started with python -m scraper (see cli.py) #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import sys
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
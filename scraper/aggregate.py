@@ -0,0 +1,317 @@
+############################################# aggregate.py #############################################
+#                                                                                                      #
+#                                 Player and team stats from cleaned games. Shot attempts, goals,      #
+#                                 assists, hits, faceoffs, etc are counted per player and team, and    #
+#                                 on ice for/against per player, split by strength state, for any      #
+#                                 number of games at once. A StatsAggregator keeps running totals, so  #
+#                                 new games can be added without counting the old ones again.          #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import json
+import os
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from .dtypes import ON_ICE_COLUMNS, ON_ICE_ID_COLUMNS
+############################################# Config ###################################################
+# Strength states, from the point of view of the player's (or team's) own team. other is penalty shots and
+# plays without a situation code. Shootouts aren't counted at all
+STATES = ["even", "advantage", "short-handed", "other"]
+EVEN, ADVANTAGE, SHORT_HANDED, OTHER = range(len(STATES))
+# Value of the state argument that sums every state
+ALL_STATES = "all"
+# Event sides
+HOME, AWAY, NO_TEAM = 0, 1, -1
+SHOT_ATTEMPTS = ["shot-on-goal", "missed-shot", "blocked-shot", "goal"]
+UNBLOCKED_SHOT_ATTEMPTS = ["shot-on-goal", "missed-shot", "goal"]
+SHOTS_ON_GOAL = ["shot-on-goal", "goal"]
+# Events counted for and against, as (events, name when it's the team's event, name when it's the other team's).
+# The first four are the on ice stats players get too
+FOR_AGAINST_STATS = [(SHOT_ATTEMPTS, "cf", "ca"), (UNBLOCKED_SHOT_ATTEMPTS, "ff", "fa"), (SHOTS_ON_GOAL, "sf", "sa"),
+                     (["goal"], "gf", "ga"), (["hit"], "hits", "hits_taken"), (["faceoff"], "faceoffs_won", "faceoffs_lost"),
+                     (["giveaway"], "giveaways", "opponent_giveaways"), (["takeaway"], "takeaways", "opponent_takeaways"),
+                     (["penalty"], "penalties_taken", "penalties_drawn")]
+ON_ICE_STATS = FOR_AGAINST_STATS[:4]
+# Individual stats as (event player column, events, name, True if the player is on the event team). The event team
+# of a hit, faceoff, block or penalty is the hitter's, winner's, shooter's or penalized player's team
+INDIVIDUAL_STATS = [("event_primary_player_id", ["goal"], "goals", True),
+                    ("event_secondary_player_id", ["goal"], "primary_assists", True),
+                    ("event_tertiary_player_id", ["goal"], "secondary_assists", True),
+                    ("event_primary_player_id", SHOTS_ON_GOAL, "shots", True),
+                    ("event_primary_player_id", SHOT_ATTEMPTS, "shot_attempts", True),
+                    ("event_primary_player_id", UNBLOCKED_SHOT_ATTEMPTS, "unblocked_shot_attempts", True),
+                    ("event_primary_player_id", ["hit"], "hits", True),
+                    ("event_secondary_player_id", ["hit"], "hits_taken", False),
+                    ("event_secondary_player_id", ["blocked-shot"], "blocks", False),
+                    ("event_primary_player_id", ["faceoff"], "faceoffs_won", True),
+                    ("event_secondary_player_id", ["faceoff"], "faceoffs_lost", False),
+                    ("event_primary_player_id", ["giveaway"], "giveaways", True),
+                    ("event_primary_player_id", ["takeaway"], "takeaways", True),
+                    ("event_primary_player_id", ["penalty"], "penalties_taken", True),
+                    ("event_secondary_player_id", ["penalty"], "penalties_drawn", False)]
+PLAYER_STATS = [stat for _, _, stat, _ in INDIVIDUAL_STATS] + [name for _, *names in ON_ICE_STATS for name in names]
+TEAM_STATS = [name for _, *names in FOR_AGAINST_STATS for name in names]
+PLAYER_KEYS = ["player_id", "team", "state"]
+TEAM_KEYS = ["team", "state"]
+HOME_ID_COLUMNS = [column for column in ON_ICE_ID_COLUMNS if column.startswith("home")]
+AWAY_ID_COLUMNS = [column for column in ON_ICE_ID_COLUMNS if column.startswith("away")]
+# On ice stats are for skaters only, so goalies don't get cf/ca/gf/ga. Games played still counts the goalie slots
+HOME_SKATER_ID_COLUMNS = [column for column in HOME_ID_COLUMNS if "skater" in column]
+AWAY_SKATER_ID_COLUMNS = [column for column in AWAY_ID_COLUMNS if "skater" in column]
+# Counts of a set of games: players and teams (by state), games played by each, and player id -> name
+Totals = namedtuple("Totals", ["players", "teams", "player_games", "team_games", "names"])
+
+# Function to count every player and team stat in a df of cleaned games (from scrape_season, iter_games,
+# ParquetStore.read, etc). Needs the on ice id and event player id columns. Returns a Totals
+def count_stats(pbp_df):
+    events = EventArrays(pbp_df)
+    return Totals(count_player_stats(pbp_df, events), count_team_stats(events), count_player_games(pbp_df),
+                  count_team_games(pbp_df), player_names(pbp_df))
+
+# What every event is, as arrays. Built once and used for every stat. Teams are numbered (team_names[code]) so
+# everything is counted by integer keys instead of grouping on strings
+class EventArrays:
+    def __init__(self, pbp_df):
+        self.event = pbp_df['event'].astype(object).to_numpy()
+        home_team = pbp_df['home_team'].astype(object).to_numpy()
+        away_team = pbp_df['away_team'].astype(object).to_numpy()
+        codes, self.team_names = pd.factorize(np.concatenate([home_team, away_team]))
+        self.teams = codes.reshape(2, len(pbp_df))
+        event_team = pbp_df['event_team'].astype(object).to_numpy()
+        self.side = np.select([event_team == home_team, event_team == away_team], [HOME, AWAY], NO_TEAM)
+        # Shootout shots aren't part of the game's stats
+        self.side[(pbp_df['strength_cat_rel'].astype(object) == "shootout-shot").to_numpy()] = NO_TEAM
+        home_skaters = pbp_df['home_skaters_on_ice'].to_numpy(dtype=int)
+        away_skaters = pbp_df['away_skaters_on_ice'].to_numpy(dtype=int)
+        other = ((pbp_df['strength_cat_rel'].astype(object) == "penalty-shot").to_numpy() | (home_skaters == 0) | (away_skaters == 0))
+        home_state = np.select([other, home_skaters > away_skaters, home_skaters < away_skaters], [OTHER, ADVANTAGE, SHORT_HANDED], EVEN)
+        away_state = np.select([other, away_skaters > home_skaters, away_skaters < home_skaters], [OTHER, ADVANTAGE, SHORT_HANDED], EVEN)
+        self.states = np.stack([home_state, away_state])
+        # Only the events some stat counts are ever looked at
+        self.counted = np.isin(self.event, list({event for types, _, _ in FOR_AGAINST_STATS for event in types})) & (self.side != NO_TEAM)
+
+    # Function to get the team and state key (team * number of states + state) of some rows, from one side's view
+    def team_keys(self, side, rows):
+        return self.teams[side, rows].astype(np.int64) * len(STATES) + self.states[side, rows]
+
+    # Function to get the row positions of the counted events of some types
+    def rows_of_type(self, types):
+        rows = np.flatnonzero(self.counted)
+        return rows[np.isin(self.event[rows], types)]
+
+# Function to turn team and state keys back into index levels
+def decode_team_keys(events, keys):
+    return [events.team_names.take(keys // len(STATES)).astype(object), pd.Index(STATES).take(keys % len(STATES))]
+
+# Function to count the individual and on ice stats of every player. Keys are player id * number of team and
+# state keys + team and state key
+def count_player_stats(pbp_df, events):
+    size = len(events.team_names) * len(STATES)
+    keys, stat_codes = [], []
+    # Individual stats. The player's side is the event team's, or the other one
+    for i, (column, types, stat, on_event_team) in enumerate(INDIVIDUAL_STATS):
+        rows = events.rows_of_type(types)
+        player_ids = pbp_df[column].to_numpy(dtype="int64", na_value=-1)[rows]
+        rows = rows[player_ids >= 0]
+        side = events.side[rows] if on_event_team else 1 - events.side[rows]
+        keys.append(player_ids[player_ids >= 0] * size + events.team_keys(side, rows))
+        stat_codes.append(np.full(len(rows), i))
+    codes, uniques = pd.factorize(np.concatenate(keys))
+    # One bincount for every stat at once, as a (key, stat) grid
+    counts = np.bincount(codes * len(INDIVIDUAL_STATS) + np.concatenate(stat_codes), minlength=len(uniques) * len(INDIVIDUAL_STATS))
+    individual = pd.DataFrame(counts.reshape(-1, len(INDIVIDUAL_STATS)), index=uniques, columns=[stat for _, _, stat, _ in INDIVIDUAL_STATS])
+    # On ice stats, for every skater on the ice, from the home team's view. Away players get them flipped
+    relevant = events.rows_of_type(ON_ICE_STATS[0][0])
+    home_flags = {}
+    for types, for_name, against_name in ON_ICE_STATS:
+        is_type = np.isin(events.event[relevant], types)
+        home_flags[for_name] = is_type & (events.side[relevant] == HOME)
+        home_flags[against_name] = is_type & (events.side[relevant] == AWAY)
+    keys, flags = [], {name: [] for name in home_flags}
+    for side, columns in [(HOME, HOME_SKATER_ID_COLUMNS), (AWAY, AWAY_SKATER_ID_COLUMNS)]:
+        player_ids = pbp_df[columns].to_numpy(dtype="int64", na_value=-1)[relevant]
+        filled = player_ids >= 0
+        # Position in relevant of every filled on ice slot
+        slots = np.broadcast_to(np.arange(len(relevant))[:, None], player_ids.shape)[filled]
+        keys.append(player_ids[filled] * size + events.team_keys(side, relevant)[slots])
+        for _, for_name, against_name in ON_ICE_STATS:
+            flags[for_name].append((home_flags[for_name] if side == HOME else home_flags[against_name])[slots])
+            flags[against_name].append((home_flags[against_name] if side == HOME else home_flags[for_name])[slots])
+    codes, uniques = pd.factorize(np.concatenate(keys))
+    on_ice = pd.DataFrame({name: np.bincount(codes, weights=np.concatenate(parts), minlength=len(uniques)).astype(np.int64)
+                           for name, parts in flags.items()}, index=uniques)
+    counts = individual.join(on_ice, how="outer").reindex(columns=PLAYER_STATS).fillna(0).astype("int64")
+    keys = counts.index.to_numpy()
+    counts.index = pd.MultiIndex.from_arrays([keys // size] + decode_team_keys(events, keys % size), names=PLAYER_KEYS)
+    return counts.sort_index()
+
+# Function to count every team stat, for and against
+def count_team_stats(events):
+    size = len(events.team_names) * len(STATES)
+    counts = {}
+    for types, for_name, against_name in FOR_AGAINST_STATS:
+        rows = events.rows_of_type(types)
+        side = events.side[rows]
+        # Once for the event team, once for the other team
+        for stat, team_side in [(for_name, side), (against_name, 1 - side)]:
+            counts[stat] = np.bincount(events.team_keys(team_side, rows), minlength=size)
+    counts = pd.DataFrame(counts, columns=TEAM_STATS)
+    counts = counts[counts.sum(axis=1) > 0]
+    keys = counts.index.to_numpy()
+    counts.index = pd.MultiIndex.from_arrays(decode_team_keys(events, keys), names=TEAM_KEYS)
+    return counts.astype("int64").sort_index()
+
+# Function to count the games each player was on the ice in, for each team they played for
+def count_player_games(pbp_df):
+    game_codes, game_ids = pd.factorize(pbp_df['game_id'].to_numpy())
+    keys = []
+    for side, columns in [("home_team", HOME_ID_COLUMNS), ("away_team", AWAY_ID_COLUMNS)]:
+        team_codes, team_names = pd.factorize(pbp_df[side].astype(object).to_numpy())
+        player_ids = pbp_df[columns].to_numpy(dtype="int64", na_value=-1)
+        filled = player_ids >= 0
+        rows = np.broadcast_to(np.arange(len(pbp_df))[:, None], player_ids.shape)[filled]
+        # One key per player and game, kept once. The game decides the team, so it doesn't need to be in the key
+        player_games = pd.unique(player_ids[filled] * len(game_ids) + game_codes[rows])
+        game_of = player_games % len(game_ids)
+        # Team of each game, from this side
+        game_team = np.empty(len(game_ids), dtype=object)
+        game_team[game_codes] = team_names.take(team_codes)
+        keys.append(pd.DataFrame({"player_id": player_games // len(game_ids), "team": game_team[game_of]}))
+    games = pd.concat(keys, ignore_index=True)
+    return games.groupby(["player_id", "team"]).size().rename("games_played")
+
+# Function to count the games each team played
+def count_team_games(pbp_df):
+    games = pbp_df[['game_id', 'home_team', 'away_team']].drop_duplicates('game_id')
+    teams = pd.concat([games['home_team'].astype(object), games['away_team'].astype(object)])
+    return teams.value_counts().rename_axis("team").rename("games_played").sort_index()
+
+# Function to get every on ice player's name, by id
+def player_names(pbp_df):
+    names = {}
+    for column in ON_ICE_COLUMNS:
+        pairs = pbp_df[[column + "_id", column]].dropna().drop_duplicates(column + "_id")
+        names.update(zip(pairs[column + "_id"].astype(int), pairs[column].astype(object)))
+    return names
+
+# Function to add the percentage stats to a players or teams df. Anything divided by zero is NaN
+def add_rates(stats_df):
+    stats_df = stats_df.copy()
+    divide = lambda top, bottom: top / bottom.where(bottom != 0)
+    for for_name, against_name in [("cf", "ca"), ("ff", "fa"), ("sf", "sa"), ("gf", "ga")]:
+        stats_df[for_name + "_pct"] = divide(stats_df[for_name], stats_df[for_name] + stats_df[against_name])
+    # On ice (team) shooting and save percentage, and their sum
+    stats_df['on_ice_sh_pct'] = divide(stats_df['gf'], stats_df['sf'])
+    stats_df['on_ice_sv_pct'] = 1 - divide(stats_df['ga'], stats_df['sa'])
+    stats_df['pdo'] = stats_df['on_ice_sh_pct'] + stats_df['on_ice_sv_pct']
+    if 'goals' in stats_df.columns:
+        stats_df['points'] = stats_df['goals'] + stats_df['primary_assists'] + stats_df['secondary_assists']
+        stats_df['shooting_pct'] = divide(stats_df['goals'], stats_df['shots'])
+        stats_df['faceoff_pct'] = divide(stats_df['faceoffs_won'], stats_df['faceoffs_won'] + stats_df['faceoffs_lost'])
+    if 'games_played' in stats_df.columns:
+        for stat in ['goals', 'points', 'cf', 'gf']:
+            if stat in stats_df.columns:
+                stats_df[stat + "_per_game"] = divide(stats_df[stat], stats_df['games_played'])
+    return stats_df
+
+# Running totals over a growing set of games. Add games with update (each game is only ever counted once), and get
+# the stats with players() and teams(). save and load keep the totals between runs, ex for nightly updates:
+#     stats = StatsAggregator.load("stats.json") if os.path.exists("stats.json") else StatsAggregator()
+#     stats.update(nhlpbpds.scrape_date(yesterday))
+#     stats.save("stats.json")
+class StatsAggregator:
+    def __init__(self):
+        self.game_ids = set()
+        self.totals = None
+
+    # Function to add the games in a df of cleaned games. Games that were already added are skipped. Returns the
+    # number of games that were new
+    def update(self, pbp_df):
+        if pbp_df is None or len(pbp_df) == 0:
+            return 0
+        new_games = pbp_df[~pbp_df['game_id'].isin(self.game_ids)]
+        if len(new_games) == 0:
+            return 0
+        totals = count_stats(new_games)
+        self.totals = totals if self.totals is None else merge_totals(self.totals, totals)
+        game_ids = set(int(game_id) for game_id in new_games['game_id'].unique())
+        self.game_ids.update(game_ids)
+        return len(game_ids)
+
+    # Function to get the player stats. state is one of STATES, or "all" to sum them. Each row is a player and
+    # team, so a player who was traded has a row for each team
+    def players(self, state=ALL_STATES, rates=True):
+        if self.totals is None:
+            return pd.DataFrame(columns=["player"] + PLAYER_STATS)
+        stats_df = select_state(self.totals.players, state).join(self.totals.player_games, how="left")
+        stats_df['games_played'] = stats_df['games_played'].fillna(0).astype("int64")
+        stats_df.insert(0, "player", stats_df.index.get_level_values("player_id").map(self.totals.names))
+        return add_rates(stats_df) if rates else stats_df
+
+    # Function to get the team stats. state works the same as in players
+    def teams(self, state=ALL_STATES, rates=True):
+        if self.totals is None:
+            return pd.DataFrame(columns=TEAM_STATS)
+        stats_df = select_state(self.totals.teams, state).join(self.totals.team_games, how="left")
+        stats_df['games_played'] = stats_df['games_played'].fillna(0).astype("int64")
+        return add_rates(stats_df) if rates else stats_df
+
+    # Function to save the totals to a json file
+    def save(self, path):
+        data = {"game_ids": sorted(self.game_ids)}
+        if self.totals is not None:
+            data.update({"names": {str(player_id): name for player_id, name in self.totals.names.items()},
+                         "players": to_columns(self.totals.players), "teams": to_columns(self.totals.teams),
+                         "player_games": to_columns(self.totals.player_games), "team_games": to_columns(self.totals.team_games)})
+        # Written to a temp file and swapped in, like the checkpoint, so a crash never loses the old totals
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    # Function to load totals saved with save
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        aggregator = cls()
+        aggregator.game_ids = set(data["game_ids"])
+        if "players" in data:
+            players = from_columns(data["players"], PLAYER_KEYS)
+            teams = from_columns(data["teams"], TEAM_KEYS)
+            player_games = from_columns(data["player_games"], ["player_id", "team"])['games_played']
+            team_games = from_columns(data["team_games"], ["team"])['games_played']
+            names = {int(player_id): name for player_id, name in data["names"].items()}
+            aggregator.totals = Totals(players, teams, player_games, team_games, names)
+        return aggregator
+
+# Function to add two Totals together
+def merge_totals(old, new):
+    add = lambda a, b: a.add(b, fill_value=0).astype("int64").sort_index()
+    names = dict(old.names)
+    names.update(new.names)
+    return Totals(add(old.players, new.players), add(old.teams, new.teams), add(old.player_games, new.player_games),
+                  add(old.team_games, new.team_games), names)
+
+# Function to get one state's rows of a counts df (without the state level), or every state summed
+def select_state(counts, state):
+    if state == ALL_STATES:
+        return counts.groupby(level=[name for name in counts.index.names if name != "state"]).sum()
+    if state not in STATES:
+        raise ValueError("state has to be one of {} or {!r}, not {!r}".format(STATES, ALL_STATES, state))
+    # A mask instead of xs, so a state no game had gives an empty df
+    return counts[counts.index.get_level_values("state") == state].droplevel("state")
+
+# Function to turn a df or Series into a dict of column lists for json
+def to_columns(counts):
+    return counts.reset_index().to_dict(orient="list")
+
+# Function to turn to_columns' dict back into a df indexed by keys. Text keys are objects, like count_stats gives
+def from_columns(columns, keys):
+    counts_df = pd.DataFrame(columns)
+    for key in keys:
+        if key != "player_id":
+            counts_df[key] = counts_df[key].astype(object)
+    return counts_df.set_index(keys)
@@ -0,0 +1,137 @@
+############################################### align.py ###############################################
+#                                                                                                      #
+#                                 Lines up the api plays with the html report rows. Both are in game   #
+#                                 order, so they're walked side by side one period and second at a     #
+#                                 time, and the few events that share a second are paired up by event  #
+#                                 type and player. Every event ends up matched or in an unmatched      #
+#                                 list.                                                                #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+from collections import namedtuple
+import numpy as np
+############################################# Config ###################################################
+# Event types that the two sources name differently, mapped to the name they're compared under
+EVENT_EQUIVALENTS = {"failed-shot-attempt": "missed-shot"}
+# Leftover events can still match an event this many seconds away in the same period, as long as the type and
+# player agree
+TIME_TOLERANCE = 1
+
+# api_rows[i] is matched to html_rows[i] (positions, not index labels), in api order. unmatched_api and
+# unmatched_html are the positions that didn't match anything
+Alignment = namedtuple("Alignment", ["api_rows", "html_rows", "unmatched_api", "unmatched_html"])
+
+# Function to align the api pbp with the parsed html report. Both need period, game_seconds_elapsed, event and
+# event_primary_player columns. The period is part of the key so the end of one period (20:00) and the start of the
+# next (0:00), which have the same game_seconds_elapsed, can't be matched to each other
+def align_events(pbp_df, html_df, tolerance=TIME_TOLERANCE):
+    api = EventStream(pbp_df)
+    html = EventStream(html_df)
+    pairs = {}
+    leftover_api = []
+    leftover_html = []
+    i = j = 0
+    # One pass over both streams. Whichever side is behind gets its second's events marked as leftovers
+    while i < len(api) and j < len(html):
+        api_second = api.keys[i]
+        html_second = html.keys[j]
+        if api_second < html_second:
+            end = api.block_end(i)
+            leftover_api.extend(api.order[i:end])
+            i = end
+        elif html_second < api_second:
+            end = html.block_end(j)
+            leftover_html.extend(html.order[j:end])
+            j = end
+        else:
+            api_end = api.block_end(i)
+            html_end = html.block_end(j)
+            unused_api, unused_html = match_block(api, html, api.order[i:api_end], html.order[j:html_end], pairs)
+            leftover_api.extend(unused_api)
+            leftover_html.extend(unused_html)
+            i = api_end
+            j = html_end
+    leftover_api.extend(api.order[i:])
+    leftover_html.extend(html.order[j:])
+    if tolerance:
+        leftover_api, leftover_html = match_nearby(api, html, leftover_api, leftover_html, pairs, tolerance)
+    api_rows = np.array(sorted(pairs), dtype=int)
+    html_rows = np.array([pairs[row] for row in api_rows], dtype=int)
+    return Alignment(api_rows, html_rows, np.array(sorted(leftover_api), dtype=int), np.array(sorted(leftover_html), dtype=int))
+
+# One side's events, sorted by period and time (stable, so events in the same second keep their order)
+class EventStream:
+    def __init__(self, df):
+        periods = df['period'].to_numpy()
+        seconds = df['game_seconds_elapsed'].to_numpy()
+        self.order = np.lexsort((seconds, periods)).tolist()
+        # (period, second) of each event in sorted order
+        self.keys = list(zip(periods[self.order].tolist(), seconds[self.order].tolist()))
+        self.events = [EVENT_EQUIVALENTS.get(event, event) for event in df['event'].tolist()]
+        # Missing players as None, so they compare equal to each other
+        players = df['event_primary_player'].astype(object)
+        self.players = players.where(players.notna(), None).tolist()
+        # Period and time of each event by position, for the tolerance pass
+        self.keys_by_row = list(zip(periods.tolist(), seconds.tolist()))
+
+    def __len__(self):
+        return len(self.order)
+
+    # Function to get the position (in sorted order) just past the events in the same second as position start
+    def block_end(self, start):
+        end = start + 1
+        while end < len(self.keys) and self.keys[end] == self.keys[start]:
+            end += 1
+        return end
+
+# Function to pair up the events of one second. Events are paired in order: first on event type and player,
+# then on event type alone for what's left, so an event whose owner couldn't be read still finds its row.
+# Adds to pairs, returns the api and html rows that weren't paired
+def match_block(api, html, api_rows, html_rows, pairs):
+    unused_html = list(html_rows)
+    unmatched = []
+    for row in api_rows:
+        match = next((other for other in unused_html if html.events[other] == api.events[row]
+                      and html.players[other] == api.players[row]), None)
+        if match is None:
+            unmatched.append(row)
+            continue
+        pairs[row] = match
+        unused_html.remove(match)
+    unused_api = []
+    for row in unmatched:
+        match = next((other for other in unused_html if html.events[other] == api.events[row]), None)
+        if match is None:
+            unused_api.append(row)
+            continue
+        pairs[row] = match
+        unused_html.remove(match)
+    return unused_api, unused_html
+
+# Function to match leftovers that are off by up to tolerance seconds (in the same period) between the sources. These
+# need both the event type and the player to agree. Leftovers are in period and time order, so this is another single pass
+def match_nearby(api, html, leftover_api, leftover_html, pairs, tolerance):
+    leftover_api = sorted(leftover_api, key=lambda row: api.keys_by_row[row])
+    leftover_html = sorted(leftover_html, key=lambda row: html.keys_by_row[row])
+    used = set()
+    unmatched_api = []
+    start = 0
+    for row in leftover_api:
+        period, second = api.keys_by_row[row]
+        while start < len(leftover_html) and html.keys_by_row[leftover_html[start]] < (period, second - tolerance):
+            start += 1
+        match = None
+        position = start
+        while position < len(leftover_html) and html.keys_by_row[leftover_html[position]] <= (period, second + tolerance):
+            other = leftover_html[position]
+            if other not in used and html.events[other] == api.events[row] and html.players[other] == api.players[row]:
+                match = other
+                break
+            position += 1
+        if match is None:
+            unmatched_api.append(row)
+            continue
+        pairs[row] = match
+        used.add(match)
+    return unmatched_api, [row for row in leftover_html if row not in used]
@@ -0,0 +1,105 @@
+############################################### cache.py ###############################################
+#                                                                                                      #
+#                                 On-disk cache for raw API and HTML report bodies. Only games         #
+#                                 that are final get stored, since their data will never change.       #
+#                                 Entries are keyed by endpoint and game id and stored gzipped. The    #
+#                                 least recently used ones are evicted once the cache goes over its    #
+#                                 size cap.                                                            #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import gzip
+import os
+import threading
+from collections import OrderedDict
+############################################# Config ###################################################
+# Game states that mean the game is over and its data won't change anymore
+FINAL_GAME_STATES = ["OFF", "FINAL"]
+# Default size cap for the cache, in megabytes. A season is about 1,400 games, and a game's html report (~1.8 MB),
+# play-by-play (~0.5 MB) and landing come to ~2.5 MB, or ~250 KB gzipped. So a season takes ~350 MB and the default
+# holds the last five or so
+DEFAULT_MAX_SIZE_MB = 2048
+# gzip level for stored bodies. The json and html shrink about 10x, and level 6 is quick to write (~20 ms for a report)
+COMPRESS_LEVEL = 6
+
+class ResponseCache:
+    # directory is where bodies get stored, one folder per endpoint. max_size_mb caps the total size on disk
+    def __init__(self, directory, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.directory = directory
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        # path -> size in bytes, ordered from least to most recently used
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self.load_entries()
+
+    # Function to pick up whatever is already in the cache directory, oldest first
+    def load_entries(self):
+        found = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, path, stat.st_size))
+        for mtime, path, size in sorted(found):
+            self.entries[path] = size
+            self.total_bytes += size
+
+    # Function to get the file path for an endpoint and game id
+    def path(self, endpoint, game_id):
+        return os.path.join(self.directory, endpoint, "{}.cache.gz".format(game_id))
+
+    # Function to get a cached body. Returns None if we don't have it
+    def get(self, endpoint, game_id):
+        with self.lock:
+            path = self.path(endpoint, game_id)
+            if path not in self.entries:
+                return None
+            self.entries.move_to_end(path)
+        try:
+            with open(path, "rb") as f:
+                body = gzip.decompress(f.read()).decode("utf-8")
+            # Bump the modified time so the lru order survives a restart
+            os.utime(path)
+        except (OSError, EOFError):
+            # File was removed from under us (or cut short). Forget about it
+            with self.lock:
+                self.forget(path)
+            return None
+        return body
+
+    # Function to store a body, then evict the least recently used entries if we are over the cap
+    def put(self, endpoint, game_id, body):
+        path = self.path(endpoint, game_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so a crash can't leave half a body in the cache
+        temp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(temp_path, "wb") as f:
+            f.write(gzip.compress(body.encode("utf-8"), compresslevel=COMPRESS_LEVEL, mtime=0))
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        with self.lock:
+            self.forget(path)
+            self.entries[path] = size
+            self.total_bytes += size
+            self.evict()
+
+    # Function to remove the least recently used entries until we are under the size cap. Call with the lock held
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            path, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # Function to drop an entry from the index. Call with the lock held
+    def forget(self, path):
+        size = self.entries.pop(path, None)
+        if size is not None:
+            self.total_bytes -= size
@@ -0,0 +1,81 @@
+############################################ checkpoint.py #############################################
+#                                                                                                      #
+#                                 Checkpoint manifest for batch runs. Keeps every game of a run as     #
+#                                 pending, done or failed in a json file that is re-written after      #
+#                                 each game, so a run that dies halfway picks up where it left off.    #
+#                                 Only the standard library, so reading one is quick.                  #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import datetime
+import json
+import os
+import threading
+############################################# Config ###################################################
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (PENDING, DONE, FAILED)
+
+class Checkpoint:
+    # path is the json file. It's loaded if it exists. shard is the "i/N" the games were picked with, if any
+    def __init__(self, path, shard=None):
+        self.path = path
+        self.shard = shard
+        self.lock = threading.Lock()
+        # game id (as a string, since it's json) -> {"status", "attempts", "rows", "error", "updated"}
+        self.games = {}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path) as f:
+            manifest = json.load(f)
+        self.shard = manifest.get("shard")
+        self.games = manifest.get("games", {})
+
+    # Function to save the manifest. Written to a temp file and swapped in, so a crash never leaves half a file
+    def save(self):
+        with self.lock:
+            folder = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder, exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"shard": self.shard, "games": self.games}, f, indent=1)
+            os.replace(temp_path, self.path)
+
+    # Function to add games as pending. Games the manifest already has keep their status. Returns how many were new
+    def add_games(self, game_ids):
+        added = 0
+        with self.lock:
+            for game_id in game_ids:
+                if str(game_id) not in self.games:
+                    self.games[str(game_id)] = {"status": PENDING, "attempts": 0}
+                    added += 1
+        return added
+
+    def mark_done(self, game_id, rows):
+        self.update(game_id, DONE, rows=rows, error=None)
+
+    def mark_failed(self, game_id, error):
+        self.update(game_id, FAILED, error=error)
+
+    def update(self, game_id, status, **fields):
+        with self.lock:
+            entry = self.games.setdefault(str(game_id), {"status": PENDING, "attempts": 0})
+            entry["status"] = status
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            entry["updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+            entry.update(fields)
+
+    # Function to get the ids of the games with a status, in the order they were added
+    def game_ids(self, status):
+        return [int(game_id) for game_id, entry in self.games.items() if entry["status"] == status]
+
+    # Function to get how many games have each status
+    def counts(self):
+        counts = {status: 0 for status in STATUSES}
+        for entry in self.games.values():
+            counts[entry["status"]] += 1
+        return counts
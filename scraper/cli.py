@@ -0,0 +1,270 @@
+################################################ cli.py ################################################
+#                                                                                                      #
+#                                 Command line batch runner. Picks games by season, date range or      #
+#                                 game id, optionally keeps only one shard of them, and scrapes them   #
+#                                 into a folder while a checkpoint manifest tracks what's done, so a   #
+#                                 run can be stopped and started again. Run with python -m scraper     #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+# pandas and requests are only imported by the commands that need them, so status (and list with --games)
+# starts right away
+import argparse
+import os
+import sys
+from .checkpoint import Checkpoint, PENDING, DONE, FAILED, STATUSES
+############################################# Config ###################################################
+CHECKPOINT_NAME = "_checkpoint.json"
+SHARD_CHECKPOINT_NAME = "_checkpoint-{}-of-{}.json"
+DEFAULT_OUT = "nhl_pbp"
+FORMATS = ["parquet", "csv"]
+
+# Function to read a --shard value like "0/4" into (0, 4)
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard has to look like i/N, ex 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError("shard i/N needs 0 <= i < N, got {}".format(value))
+    return index, count
+
+# Function to get the shard as the text saved in the checkpoint, or None
+def shard_text(shard):
+    return "{}/{}".format(*shard) if shard else None
+
+# Function to keep the games that belong to a shard. Game ids are spread evenly by their remainder, so every
+# machine gets the same split without having to talk to each other
+def shard_games(game_ids, shard):
+    if shard is None:
+        return list(game_ids)
+    index, count = shard
+    return [game_id for game_id in game_ids if game_id % count == index]
+
+# Function to read game ids from a file. Ids can be split by spaces, commas or new lines, and # starts a comment
+def read_game_ids(path):
+    game_ids = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#")[0]
+            game_ids.extend(int(token) for token in line.replace(",", " ").split())
+    return game_ids
+
+# Function to get the games picked by the command line, in order without repeats, with the shard applied. Progress
+# goes to stderr, so the output of list can be saved and used as a --games-file. Returns None if part of the schedule
+# couldn't be fetched, since the games from those weeks would be missing
+def resolve_games(args):
+    game_ids = list(args.games or [])
+    if args.games_file:
+        game_ids.extend(read_game_ids(args.games_file))
+    if args.season or args.start:
+        from .schedule import get_game_ids, get_season_game_ids, REGULAR_AND_PLAYOFFS, ScheduleError
+        try:
+            for season in args.season or []:
+                print("Finding games from the {} season...".format(season), file=sys.stderr)
+                game_ids.extend(get_season_game_ids(season, game_types=args.game_types or REGULAR_AND_PLAYOFFS))
+            if args.start:
+                print("Finding games from {} to {}...".format(args.start, args.end or args.start), file=sys.stderr)
+                game_ids.extend(get_game_ids(args.start, args.end or args.start, game_types=args.game_types))
+        except ScheduleError as error:
+            print(error, file=sys.stderr)
+            return None
+    return shard_games(list(dict.fromkeys(game_ids)), args.shard)
+
+# Function to check if the command line picked any games
+def has_selection(args):
+    return bool(args.games or args.games_file or args.season or args.start)
+
+# Function to get the output folder. Each shard gets its own by default (nhl_pbp-shard-i-of-N), since a ParquetStore's
+# manifest is rewritten in full by whoever writes to it, so shards sharing one would lose each other's games
+def out_folder(args):
+    if args.out:
+        return args.out
+    if args.shard:
+        return "{}-shard-{}-of-{}".format(DEFAULT_OUT, *args.shard)
+    return DEFAULT_OUT
+
+# Function to get the checkpoint's path. Each shard's is named after it, so csv shards can share a folder
+def checkpoint_path(args):
+    if args.checkpoint:
+        return args.checkpoint
+    if args.shard:
+        return os.path.join(out_folder(args), SHARD_CHECKPOINT_NAME.format(*args.shard))
+    return os.path.join(out_folder(args), CHECKPOINT_NAME)
+
+# Function to find the other shards' checkpoints in the output folder
+def other_shards(args):
+    folder = out_folder(args)
+    if not os.path.isdir(folder):
+        return []
+    own = os.path.basename(checkpoint_path(args))
+    return sorted(name for name in os.listdir(folder) if name != own and name.startswith("_checkpoint-") and name.endswith(".json"))
+
+# Function to make the function that saves a game's df, writer(game_id, pbp_df). Parquet goes in a ParquetStore,
+# csv is one file per game
+def make_writer(out, output_format):
+    if output_format == "parquet":
+        from .storage import ParquetStore
+        store = ParquetStore(out)
+        return lambda game_id, pbp_df: store.write(pbp_df)
+    os.makedirs(out, exist_ok=True)
+
+    def write_csv(game_id, pbp_df):
+        path = os.path.join(out, "{}.csv".format(game_id))
+        # Write to a temp file first so a killed run never leaves half a game behind
+        temp_path = os.path.join(out, ".{}.csv.tmp".format(game_id))
+        pbp_df.to_csv(temp_path, index=False)
+        os.replace(temp_path, path)
+    return write_csv
+
+# Function to scrape one game and save it. Returns (game_id, rows, error). Errors are caught so one bad game
+# can't stop the run, it just gets marked failed
+def run_game(game_id, writer, columns=None):
+    from . import nhl_pbp_data_scraper as scraper
+    try:
+        payloads = scraper.fetch_game(game_id, columns)
+        if payloads is None:
+            return game_id, 0, "download failed"
+        pbp_df = scraper.parse_game(payloads)
+        if len(pbp_df) == 0:
+            return game_id, 0, "no plays"
+        writer(game_id, pbp_df)
+        return game_id, len(pbp_df), None
+    except Exception as error:
+        return game_id, 0, "{}: {}".format(type(error).__name__, error)
+
+def run(args):
+    from .nhl_pbp_data_scraper import plan_columns
+    try:
+        plan_columns(args.columns)
+    except ValueError as error:
+        print(error)
+        return 2
+    if args.shard and args.format == "parquet" and other_shards(args):
+        print("{} already has another shard's checkpoint ({}). Shards can't share a parquet folder, give each its own --out"
+              .format(out_folder(args), ", ".join(other_shards(args))))
+        return 2
+    checkpoint = Checkpoint(checkpoint_path(args), shard_text(args.shard))
+    if checkpoint.shard != shard_text(args.shard):
+        print("{} was made for shard {}, not {}".format(checkpoint.path, checkpoint.shard, shard_text(args.shard)))
+        return 2
+    if has_selection(args):
+        game_ids = resolve_games(args)
+        if game_ids is None:
+            print("Nothing was added. Run it again once the schedule can be fetched")
+            return 1
+        added = checkpoint.add_games(game_ids)
+        print("Added {} games to {}".format(added, checkpoint.path))
+    elif not checkpoint.games:
+        print("Nothing to do. Pick games with --season, --start/--end, --games or --games-file")
+        return 2
+    checkpoint.save()
+    games = checkpoint.game_ids(PENDING)
+    if args.retry_failed:
+        games += checkpoint.game_ids(FAILED)
+    counts = checkpoint.counts()
+    print("{} games to scrape ({} done, {} failed, {} pending)\n".format(len(games), counts[DONE], counts[FAILED], counts[PENDING]))
+    if not games:
+        return 0
+    from .pipeline import map_in_threads
+    from . import http_client
+    if args.cache:
+        http_client.set_cache(args.cache)
+    writer = make_writer(out_folder(args), args.format)
+    columns = args.columns
+    if columns is not None and args.format == "parquet":
+        # The store partitions on these, so they have to come along
+        columns = columns + [column for column in ["game_id", "game_season", "game_type"] if column not in columns]
+    try:
+        for i, (game_id, rows, error) in enumerate(map_in_threads(lambda game_id: run_game(game_id, writer, columns), games, args.workers)):
+            if error is None:
+                checkpoint.mark_done(game_id, rows)
+                print("[{}/{}] Game {} done ({} rows)".format(i + 1, len(games), game_id, rows))
+            else:
+                checkpoint.mark_failed(game_id, error)
+                print("[{}/{}] Game {} failed: {}".format(i + 1, len(games), game_id, error))
+            checkpoint.save()
+    except KeyboardInterrupt:
+        print("\nStopped. Run the same command again to pick up where this left off")
+        return 130
+    counts = checkpoint.counts()
+    print("\nFinished. {} done, {} failed, {} pending".format(counts[DONE], counts[FAILED], counts[PENDING]))
+    return 1 if counts[FAILED] else 0
+
+def list_games(args):
+    game_ids = resolve_games(args)
+    if game_ids is None:
+        return 1
+    for game_id in game_ids:
+        print(game_id)
+    return 0
+
+def status(args):
+    path = checkpoint_path(args)
+    if not os.path.exists(path):
+        print("No checkpoint at {}".format(path))
+        return 2
+    checkpoint = Checkpoint(path)
+    counts = checkpoint.counts()
+    total = sum(counts.values())
+    print("{}{}".format(path, " (shard {})".format(checkpoint.shard) if checkpoint.shard else ""))
+    for name in STATUSES:
+        print("{:<8}{:>8}".format(name, counts[name]))
+    print("{:<8}{:>8}".format("total", total))
+    if args.show:
+        print()
+        for game_id in checkpoint.game_ids(args.show):
+            error = checkpoint.games[str(game_id)].get("error")
+            print("{}{}".format(game_id, "  " + error if error else ""))
+    return 0
+
+# Function to add the arguments that pick games
+def add_selection_arguments(parser):
+    parser.add_argument("--season", nargs="+", help="seasons to scrape, formatted like the API, ex 20232024")
+    parser.add_argument("--start", help="first date to scrape, YYYY-MM-DD")
+    parser.add_argument("--end", help="last date to scrape, YYYY-MM-DD (default --start)")
+    parser.add_argument("--games", nargs="+", type=int, help="game ids to scrape")
+    parser.add_argument("--games-file", help="file of game ids (split by spaces, commas or lines)")
+    parser.add_argument("--game-types", nargs="+", type=int,
+                        help="game types to keep, 1 = pre-season, 2 = regular season, 3 = playoffs (default 2 3 for seasons, all for dates)")
+    parser.add_argument("--shard", type=parse_shard, help="only keep shard i of N, ex 0/4. Games are split by game_id %% N")
+
+# Function to add the arguments that find the checkpoint
+def add_checkpoint_arguments(parser):
+    parser.add_argument("--out", help="folder the games (and the checkpoint) go in (default nhl_pbp, or nhl_pbp-shard-i-of-N with --shard)")
+    parser.add_argument("--checkpoint", help="checkpoint file (default OUT/_checkpoint.json, or OUT/_checkpoint-i-of-N.json with --shard)")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m scraper", description="Scrape NHL play-by-play in bulk, with a checkpoint to resume from")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="scrape games, resuming from the checkpoint if there is one")
+    add_selection_arguments(run_parser)
+    add_checkpoint_arguments(run_parser)
+    run_parser.add_argument("--format", choices=FORMATS, default="parquet", help="parquet dataset (needs pyarrow) or one csv per game (default parquet)")
+    run_parser.add_argument("--workers", type=int, default=4, help="games to scrape at once (default 4)")
+    run_parser.add_argument("--columns", nargs="+", help="only keep these columns (see CLEAN_COLUMNS)")
+    run_parser.add_argument("--retry-failed", action="store_true", help="also try the games that failed last time")
+    run_parser.add_argument("--cache", help="folder for the on-disk response cache")
+    run_parser.set_defaults(handler=run)
+
+    list_parser = commands.add_parser("list", help="print the game ids a selection picks, without scraping")
+    add_selection_arguments(list_parser)
+    list_parser.set_defaults(handler=list_games)
+
+    status_parser = commands.add_parser("status", help="show how far a run got")
+    add_checkpoint_arguments(status_parser)
+    status_parser.add_argument("--shard", type=parse_shard, help="the shard the run used, to find its checkpoint")
+    status_parser.add_argument("--show", choices=STATUSES, help="also list the games with this status")
+    status_parser.set_defaults(handler=status)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "end", None) and not args.start:
+        parser.error("--end needs --start")
+    if args.command == "list" and not has_selection(args):
+        parser.error("pick games with --season, --start/--end, --games or --games-file")
+    return args.handler(args)
@@ -0,0 +1,58 @@
+############################################### dtypes.py ##############################################
+#                                                                                                      #
+#                                 Compact column types for cleaned games. Text columns with only a     #
+#                                 few distinct values (events, teams, strengths, player names) become  #
+#                                 categories, small counts become int8/int16 and player ids become     #
+#                                 nullable Int32, which cuts the memory a season of pbp takes by a     #
+#                                 lot.                                                                 #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import pandas as pd
+from pandas.api.types import union_categoricals
+############################################# Config ###################################################
+ON_ICE_COLUMNS = ['home_skater1', 'home_skater2', 'home_skater3', 'home_skater4', 'home_skater5', 'home_skater6', 'home_goalie',
+                  'away_skater1', 'away_skater2', 'away_skater3', 'away_skater4', 'away_skater5', 'away_skater6', 'away_goalie']
+CATEGORY_COLUMNS = ["game_date", "venue", "home_team", "away_team", "home_coach", "away_coach", "period_type", "event",
+                    "event_team", "shot_type", "zone", "home_team_def_side", "event_primary_player", "event_secondary_player",
+                    "event_tertiary_player", "situation_code", "strength", "strength_rel", "strength_cat_rel"] + ON_ICE_COLUMNS
+INT8_COLUMNS = ["period", "home_score", "away_score", "home_skaters_on_ice", "away_skaters_on_ice", "home_goalie_on_ice",
+                "away_goalie_on_ice"]
+INT16_COLUMNS = ["period_seconds_elapsed", "game_seconds_elapsed"]
+# Player ids of the on ice players (rosterSpots playerId), ex home_skater1_id. Empty slots are <NA>
+ON_ICE_ID_COLUMNS = [column + "_id" for column in ON_ICE_COLUMNS]
+# Player ids of the event players
+EVENT_PLAYER_ID_COLUMNS = ["event_primary_player_id", "event_secondary_player_id", "event_tertiary_player_id"]
+
+# Function to give a clean_columns df its compact types. Int columns with a missing value are left alone, except for
+# the player ids which are always nullable Int32
+def compact_dtypes(pbp_df):
+    pbp_df = pbp_df.copy()
+    for column in CATEGORY_COLUMNS:
+        if column in pbp_df.columns:
+            pbp_df[column] = pbp_df[column].astype("category")
+    for columns, dtype in [(INT8_COLUMNS, "int8"), (INT16_COLUMNS, "int16")]:
+        for column in columns:
+            if column in pbp_df.columns and pbp_df[column].notna().all():
+                pbp_df[column] = pbp_df[column].astype(dtype)
+    for column in EVENT_PLAYER_ID_COLUMNS + ON_ICE_ID_COLUMNS:
+        if column in pbp_df.columns:
+            pbp_df[column] = pbp_df[column].astype("Int32")
+    return pbp_df
+
+# Function to join several games' dfs. Each game has its own set of categories, and pd.concat turns a category
+# column back into plain objects unless the categories match, so they get unioned first
+def concat_games(frames):
+    frames = [frame for frame in frames if frame is not None]
+    if len(frames) <= 1:
+        return pd.concat(frames) if frames else pd.DataFrame()
+    frames = [frame.copy() for frame in frames]
+    for column in frames[0].columns:
+        values = [frame[column] for frame in frames if column in frame.columns]
+        if len(values) != len(frames) or not all(isinstance(value.dtype, pd.CategoricalDtype) for value in values):
+            continue
+        categories = union_categoricals([value.values for value in values]).categories
+        for frame in frames:
+            frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames)
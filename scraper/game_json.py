@@ -0,0 +1,73 @@
+############################################# game_json.py #############################################
+#                                                                                                      #
+#                                 Builds the plays and roster dfs straight from the play-by-play       #
+#                                 json, using a fixed list of fields. Each field is pulled straight    #
+#                                 into one typed array, instead of normalizing the whole response      #
+#                                 and then each nested list again. Every field in the schema is        #
+#                                 always a column, even if no play in the game has it.                 #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import numpy as np
+import pandas as pd
+from .metrics import timed_stage
+############################################# Config ###################################################
+# Kinds of field. "int" fields are int64 (float64 if a value is missing), "float" fields are float64 with NaN for
+# missing values (player ids included, like json_normalize gives), and "str" fields are objects with NaN for missing
+# Play fields as (parent, key, kind). The column is parent.key, or just key at the top level
+PLAY_FIELDS = [(None, "eventId", "int"), (None, "period", "int"), ("periodDescriptor", "number", "int"),
+               ("periodDescriptor", "periodType", "str"), (None, "timeInPeriod", "str"), (None, "timeRemaining", "str"),
+               (None, "situationCode", "str"), (None, "homeTeamDefendingSide", "str"), (None, "typeCode", "int"),
+               (None, "typeDescKey", "str"), (None, "sortOrder", "int"),
+               ("details", "xCoord", "float"), ("details", "yCoord", "float"), ("details", "zoneCode", "str"),
+               ("details", "eventOwnerTeamId", "float"), ("details", "shotType", "str"), ("details", "reason", "str"),
+               ("details", "secondaryReason", "str"), ("details", "typeCode", "str"), ("details", "descKey", "str"),
+               ("details", "duration", "float"), ("details", "awayScore", "float"), ("details", "homeScore", "float"),
+               ("details", "awaySOG", "float"), ("details", "homeSOG", "float"), ("details", "goalieInNetId", "float"),
+               ("details", "scoringPlayerId", "float"), ("details", "scoringPlayerTotal", "float"),
+               ("details", "assist1PlayerId", "float"), ("details", "assist1PlayerTotal", "float"),
+               ("details", "assist2PlayerId", "float"), ("details", "assist2PlayerTotal", "float"),
+               ("details", "shootingPlayerId", "float"), ("details", "blockingPlayerId", "float"),
+               ("details", "hittingPlayerId", "float"), ("details", "hitteePlayerId", "float"),
+               ("details", "winningPlayerId", "float"), ("details", "losingPlayerId", "float"), ("details", "playerId", "float"),
+               ("details", "committedByPlayerId", "float"), ("details", "drawnByPlayerId", "float"),
+               ("details", "servedByPlayerId", "float")]
+ROSTER_FIELDS = [(None, "teamId", "int"), (None, "playerId", "int"), ("firstName", "default", "str"), ("lastName", "default", "str"),
+                 (None, "sweaterNumber", "int"), (None, "positionCode", "str")]
+# Columns to fill from another one when no play has them. Newer responses only have the period in periodDescriptor
+FALLBACKS = {"period": "periodDescriptor.number"}
+
+# Function to build the plays df from the play-by-play json's plays list
+@timed_stage
+def build_plays(plays):
+    return build_frame(plays, PLAY_FIELDS)
+
+# Function to build the players df from the play-by-play json's rosterSpots list
+@timed_stage
+def build_roster(roster_spots):
+    return build_frame(roster_spots, ROSTER_FIELDS)
+
+# Function to build a df with one column per field, and one row per item
+def build_frame(items, fields):
+    # Each nested object is looked up once per item, not once per field
+    parents = {parent: [item.get(parent) or {} for item in items] for parent in {parent for parent, _, _ in fields if parent}}
+    columns = {}
+    for parent, key, kind in fields:
+        source = parents[parent] if parent else items
+        columns[key if parent is None else "{}.{}".format(parent, key)] = to_array(source, key, kind)
+    for column, fallback in FALLBACKS.items():
+        if column in columns and fallback in columns and len(items) and pd.isna(columns[column]).all():
+            columns[column] = columns[fallback]
+    return pd.DataFrame(columns, copy=False)
+
+# Function to pull one key out of every object into an array of its kind. Missing keys come back as NaN
+def to_array(objects, key, kind):
+    values = [value.get(key, np.nan) for value in objects]
+    if kind == "int":
+        try:
+            return np.array(values, dtype=np.int64)
+        except (TypeError, ValueError):
+            # NaN (or a null) can't be an int
+            return np.array(values, dtype=float)
+    return np.array(values, dtype=float if kind == "float" else object)
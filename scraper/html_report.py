@@ -0,0 +1,206 @@
+############################################ html_report.py ############################################
+#                                                                                                      #
+#                                 Parser for the HTML play-by-play report. Instead of building a       #
+#                                 full BeautifulSoup tree, the report is tokenized once and only the   #
+#                                 cells we need (td elements with a bborder class) are kept. Rows go   #
+#                                 straight into column lists, and one df is built at the end.          #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import re
+from html.parser import HTMLParser
+import pandas as pd
+import numpy as np
+############################################# Config ###################################################
+# Every 8 cells = 1 row on the html pbp report
+CELLS_PER_ROW = 8
+# Rows with these events won't exist in the api data, so they are skipped. "Event" is the header row
+SKIPPED_EVENTS = ["PGSTR", "PGEND", "ANTHEM", "Event"]
+BASE_COLUMNS = ["event_num", "timeInPeriod", "period", "strength", "event", "description"]
+# Start of an event row. Everything before one is whole rows, so a growing report can be tokenized from there on
+ROW_START_RE = re.compile(r'<tr class="(?:even|odd)Color"')
+# Events where the description looks like TEAM #NUMBER LASTNAME ...
+NUMBER_FIRST_EVENTS = ["HIT", "MISS", "BLOCK", "PENL", "GOAL"]
+# Events where the description looks like TEAM EVENT - #NUMBER LASTNAME ...
+NUMBER_AFTER_DASH_EVENTS = ["GIVE", "TAKE", "SHOT"]
+# Descriptions are split on single spaces, so a "token" is anything that isn't a space
+TEAM_RE = re.compile(r"^([^ ]*) ", re.DOTALL)
+NUMBER_FIRST_RE = re.compile(r"^[^ ]* ([^ ]*)", re.DOTALL)
+# Team penalties are served by someone else. TOR TEAM Too many men/ice - bench(2 min) Served By: #16 MARNER, ...
+SERVED_BY_RE = re.compile(r"^.*?By: ([^ ]*)", re.DOTALL)
+NUMBER_AFTER_DASH_RE = re.compile(r"^(?:[^ ]* ){3}([^ ]*)", re.DOTALL)
+# Faceoffs. TEAM won ZONE Zone - AWAY #NUMBER LASTNAME vs HOME #NUMBER LASTNAME. The 6th token is the
+# away team, and if that's not the winner we take the number after "vs " since last names can be more than one word
+FACEOFF_RE = re.compile(r"^(?:[^ ]* ){5}(?P<first_team>[^ ]*)(?: (?P<first_number>[^ ]*))?", re.DOTALL)
+FACEOFF_VS_RE = re.compile(r"^.*?vs [^ ]* ([^ ]*)", re.DOTALL)
+SWEATER_NUMBER_RE = re.compile(r"\d+")
+
+# Tokenizer that only keeps the text, player titles and sweater numbers of td elements with a bborder class
+class ReportCellParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # Each cell is (text, [font titles], [font texts])
+        self.cells = []
+        # How many td's deep we are inside the current bborder cell. 0 means we aren't in one
+        self.depth = 0
+        self.text = []
+        self.titles = []
+        self.numbers = []
+        self.in_font = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "td":
+            if self.depth:
+                self.depth += 1
+            elif "bborder" in (dict(attrs).get("class") or ""):
+                self.depth = 1
+                self.text = []
+                self.titles = []
+                self.numbers = []
+        # The on ice cells hold one font element per player, with the position and name in the title and the
+        # sweater number as its text
+        elif tag == "font" and self.depth:
+            self.titles.append(dict(attrs).get("title") or "")
+            self.numbers.append("")
+            self.in_font = True
+
+    def handle_endtag(self, tag):
+        if tag == "font":
+            self.in_font = False
+        elif tag == "td" and self.depth:
+            self.depth -= 1
+            if self.depth == 0:
+                self.cells.append(("".join(self.text), self.titles, self.numbers))
+
+    def handle_data(self, data):
+        if self.depth:
+            self.text.append(data)
+            if self.in_font:
+                self.numbers[-1] += data
+
+# Function to parse the html report into a df with one row per event. Columns are event_num, timeInPeriod,
+# period, strength, event, description, the on ice players (home_skater1...away_goalie) and their sweater
+# numbers (home_skater1_number...away_goalie_number)
+def parse_report(html_doc):
+    return build_report(tokenize_report(html_doc))
+
+# Function to get the bborder cells of a report (or a piece of one that starts between rows)
+def tokenize_report(html_doc):
+    parser = ReportCellParser()
+    parser.feed(html_doc)
+    parser.close()
+    return parser.cells
+
+# Function to build the report df (see parse_report) from its cells
+def build_report(cells):
+    columns = {column: [] for column in BASE_COLUMNS}
+    n_rows = 0
+    for i in range(0, len(cells) - CELLS_PER_ROW + 1, CELLS_PER_ROW):
+        row = cells[i:i + CELLS_PER_ROW]
+        event = row[4][0].strip()
+        if event in SKIPPED_EVENTS:
+            continue
+        # Addying try catch in case of some html error
+        try:
+            period = int(row[1][0].strip())
+        except ValueError:
+            print("Error assigning a variable from an html report row")
+            continue
+        # Clean time because its formatted with elapsed/remaining combined. We will only use elapsed
+        period_time_elapsed = clean_time(row[3][0].strip())
+        if len(period_time_elapsed.split(":")[0]) == 1:
+            period_time_elapsed = "0" + period_time_elapsed
+        columns["event_num"].append(row[0][0].strip())
+        columns["timeInPeriod"].append(period_time_elapsed)
+        columns["period"].append(period)
+        columns["strength"].append(row[2][0].strip())
+        columns["event"].append(event)
+        columns["description"].append(row[5][0].strip())
+        players = {}
+        add_players(players, row[6][1], "away", row[6][2])
+        add_players(players, row[7][1], "home", row[7][2])
+        for column, player in players.items():
+            # First time we see this column, fill in the rows before it
+            if column not in columns:
+                columns[column] = [np.nan] * n_rows
+            columns[column].append(player)
+        n_rows += 1
+        # Pad any player column this row didn't have
+        for values in columns.values():
+            if len(values) < n_rows:
+                values.append(np.nan)
+    return pd.DataFrame(columns)
+
+# Tokenizer for a report that keeps growing, like a live game's. The report is re-sent in full, but everything up to
+# the last event row is the same as last time, so only the rest gets tokenized. If the start of the report did change,
+# the whole thing is tokenized again
+class GrowingReport:
+    def __init__(self):
+        # Report text up to the start of the last event row seen, and its cells
+        self.head = ""
+        self.head_cells = []
+
+    # Function to get the cells of a new version of the report
+    def update(self, html_doc):
+        if not html_doc.startswith(self.head):
+            self.head = ""
+            self.head_cells = []
+        # The last row is left out of the head, since it can still be cut off or change
+        starts = [match.start() for match in ROW_START_RE.finditer(html_doc, len(self.head))]
+        if starts:
+            self.head_cells = self.head_cells + tokenize_report(html_doc[len(self.head):starts[-1]])
+            self.head = html_doc[:starts[-1]]
+        return self.head_cells + tokenize_report(html_doc[len(self.head):])
+
+# Func to clean the time that is on the html report
+def clean_time(time):
+    # Time in the html report is formated weird when scraped so we need to fix. Its time remaining and time elapsed combined. Ex - 20:000:00
+    split_time = time.split(":")
+    time_elapsed = split_time[0] + ":" + split_time[1][:2]
+    return time_elapsed
+
+# Function to add players in the html df. player_titles are the titles of the font elements in an on ice cell,
+# and player_numbers their text (the sweater numbers), added as <column>_number
+def add_players(event_dict, player_titles, home_or_away, player_numbers=None):
+    for i in range(1, len(player_titles) + 1):
+        player = player_titles[i - 1]
+        player_split_name = player.split(" - ")[1]
+        player_split_pos = player.split(" - ")[0]
+        if player_split_pos == "Goalie":
+            skater = "{}_goalie".format(home_or_away)
+        else:
+            skater = '{}_skater{}'.format(home_or_away, i)
+        event_dict[skater] = player_split_name
+        if player_numbers is not None:
+            number = player_numbers[i - 1].strip()
+            event_dict[skater + "_number"] = int(number) if number.isdigit() else np.nan
+    return event_dict
+
+# Function to build a (team, sweater number) -> player lookup from the players df
+def build_player_index(players_df):
+    # Keep the first player if a number somehow shows up twice for a team
+    players = players_df.drop_duplicates(subset=['team', 'sweater_number'])
+    return dict(zip(zip(players['team'], players['sweater_number']), players['player']))
+
+# Function to get the event owner for every html report row at once. Events that don't have a player (stoppages,
+# period start/end, etc), or rows we can't read, get NaN
+def extract_event_primary_players(events, descriptions, player_index):
+    descriptions = descriptions.str.replace('\xa0', ' ', regex=False)
+    teams = descriptions.str.extract(TEAM_RE, expand=False)
+    # The token holding the sweater number, ex "#91"
+    tokens = pd.Series(np.nan, index=descriptions.index, dtype=object)
+    number_first = events.isin(NUMBER_FIRST_EVENTS)
+    served = number_first & descriptions.str.contains("Served", regex=False)
+    tokens[number_first & ~served] = descriptions[number_first & ~served].str.extract(NUMBER_FIRST_RE, expand=False)
+    tokens[served] = descriptions[served].str.extract(SERVED_BY_RE, expand=False)
+    after_dash = events.isin(NUMBER_AFTER_DASH_EVENTS)
+    tokens[after_dash] = descriptions[after_dash].str.extract(NUMBER_AFTER_DASH_RE, expand=False)
+    faceoffs = events == "FAC"
+    faceoff_tokens = descriptions[faceoffs].str.extract(FACEOFF_RE)
+    versus = descriptions[faceoffs].str.extract(FACEOFF_VS_RE, expand=False)
+    tokens[faceoffs] = faceoff_tokens['first_number'].where(faceoff_tokens['first_team'] == teams[faceoffs], versus)
+    numbers = tokens.str.replace('#', '', regex=False)
+    numbers = pd.to_numeric(numbers.where(numbers.str.fullmatch(SWEATER_NUMBER_RE) == True), errors='coerce')
+    players = [player_index.get(key, np.nan) for key in zip(teams, numbers)]
+    return pd.Series(players, index=descriptions.index, dtype=object)
@@ -0,0 +1,176 @@
+########################################### http_client.py #############################################
+#                                                                                                      #
+#                                 Shared HTTP session for the scraper. Every request to the            #
+#                                 NHL API and the HTML reports goes through one pooled                 #
+#                                 session so keep-alive connections are re-used across games.          #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from .cache import ResponseCache, FINAL_GAME_STATES, DEFAULT_MAX_SIZE_MB
+from .throttle import RequestScheduler, is_throttled, get_retry_after
+from . import metrics
+# orjson decodes the big play-by-play responses a lot faster. It's optional, json is used without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+############################################# Config ###################################################
+# Max number of keep-alive connections held open per host. Keep this >= the number of workers
+# used with scrape_date, otherwise extra connections get opened and thrown away
+POOL_SIZE = 16
+# Seconds to wait on a request before giving up on that try
+REQUEST_TIMEOUT = 30
+# Where the requests go. Can be pointed somewhere else (ex a local fake server) with set_base_urls
+API_BASE_URL = "https://api-web.nhle.com/v1"
+HTML_REPORT_BASE_URL = "https://www.nhl.com/scores/htmlreports"
+
+session = None
+session_lock = threading.Lock()
+# On-disk cache for finished games. Off until set_cache is called
+cache = None
+# Rate limits, retries and concurrency for every host (see throttle.py)
+scheduler = RequestScheduler()
+
+# Function to decode a json body, with orjson when it's installed. Raises a ValueError for bad json either way
+def loads(body):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+# Function to get the shared session, building it the first time it is needed
+def get_session():
+    global session
+    if session is None:
+        with session_lock:
+            if session is None:
+                session = build_session(POOL_SIZE)
+    return session
+
+# Function to build a session with a connection pool big enough for pool_size concurrent requests per host
+def build_session(pool_size):
+    new_session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    new_session.mount("https://", adapter)
+    new_session.mount("http://", adapter)
+    return new_session
+
+# Function to swap in a different session (or None to rebuild the default one on next use)
+def set_session(new_session):
+    global session
+    with session_lock:
+        session = new_session
+
+# Function to swap in a different RequestScheduler, ex with other rates or retry settings
+def set_scheduler(new_scheduler):
+    global scheduler
+    scheduler = new_scheduler
+    return scheduler
+
+# Function to point requests at different hosts. Leave one as None to keep it
+def set_base_urls(api=None, html_reports=None):
+    global API_BASE_URL, HTML_REPORT_BASE_URL
+    if api is not None:
+        API_BASE_URL = api.rstrip("/")
+    if html_reports is not None:
+        HTML_REPORT_BASE_URL = html_reports.rstrip("/")
+
+# Function to build an api url, ex api_url("gamecenter/2023020061/play-by-play")
+def api_url(path):
+    return "{}/{}".format(API_BASE_URL, path)
+
+# Function to build a game's html report url. Example: https://www.nhl.com/scores/htmlreports/20232024/PL010035.HTM
+def html_report_url(season, game_id):
+    return "{}/{}/PL0{}.HTM".format(HTML_REPORT_BASE_URL, season, str(game_id)[5:])
+
+# Function to turn on the on-disk cache for finished games. Pass None to turn it back off
+def set_cache(directory, max_size_mb=DEFAULT_MAX_SIZE_MB):
+    global cache
+    cache = ResponseCache(directory, max_size_mb) if directory is not None else None
+    return cache
+
+# Function to make a GET request with the shared session. Returns the response, or None if the request failed.
+# Requests wait their turn with the host's limiter, and throttled ones (429/5xx, connection errors) are tried again
+# with backoff. Every try is recorded in the shared metrics (see metrics.py)
+def get_url(url, source, headers=None):
+    limiter = scheduler.limiter(url)
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        req = None
+        error = None
+        limiter.acquire()
+        try:
+            req = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as req_exc:
+            error = req_exc
+        throttled = is_throttled(req)
+        limiter.release(throttled, get_retry_after(req))
+        wait = scheduler.backoff(attempt, req) if throttled and attempt < scheduler.max_retries else None
+        if wait is None:
+            break
+        record_request(source, start, req, error=type(error).__name__ if error is not None else "http")
+        metrics.get_metrics().record_retry(source, attempt + 1, wait)
+        time.sleep(wait)
+        attempt += 1
+    # Handle any exception related to the request
+    if error is not None:
+        print(f"{source} request failed: {error}")
+        record_request(source, start, req, error=type(error).__name__)
+        return None
+    try:
+        req.raise_for_status()
+    # Handle HTTP errors
+    except requests.exceptions.HTTPError as http_err:
+        print(f"{source} HTTP error occurred: {http_err}")
+        record_request(source, start, req, error="http")
+        return None
+    record_request(source, start, req)
+    return req
+
+# Function to add a request to the shared metrics. req is None if we never got a response
+def record_request(source, start, req, error=None):
+    size = len(req.content) if req is not None else 0
+    status = req.status_code if req is not None else None
+    metrics.get_metrics().record_request(source, time.perf_counter() - start, size, status, error)
+
+# Function to get a game's json from one of the api endpoints. Comes from the cache when we have it,
+# and gets stored there when the game is final. Returns None if the request failed
+def fetch_json(url, source, endpoint, game_id):
+    body = cache.get(endpoint, game_id) if cache is not None else None
+    from_cache = body is not None
+    if from_cache:
+        metrics.get_metrics().record_cache_hit(source)
+    else:
+        req = get_url(url, source)
+        if req is None:
+            return None
+        body = req.text
+    # Handle value-related issues, like a bad json body
+    try:
+        data = loads(body)
+    except ValueError as val_err:
+        print(f"{source} Value error occured: {val_err}")
+        return None
+    if cache is not None and not from_cache and data.get('gameState') in FINAL_GAME_STATES:
+        cache.put(endpoint, game_id, body)
+    return data
+
+# Function to get a game's text body, like the html report. Same as fetch_json, but the caller has to
+# tell us if the game is final since the body itself doesn't say
+def fetch_text(url, source, endpoint, game_id, final=False):
+    body = cache.get(endpoint, game_id) if cache is not None else None
+    if body is not None:
+        metrics.get_metrics().record_cache_hit(source)
+        return body
+    req = get_url(url, source)
+    if req is None:
+        return None
+    if cache is not None and final:
+        cache.put(endpoint, game_id, req.text)
+    return req.text
@@ -0,0 +1,174 @@
+################################################ live.py ###############################################
+#                                                                                                      #
+#                                 Live game tracking. A LiveGame polls the play-by-play and the HTML   #
+#                                 report with conditional requests, and only cleans the plays that     #
+#                                 are new since the last poll. Cleaned plays are kept, along with the  #
+#                                 running score, and only the new part of the HTML report is           #
+#                                 tokenized, so each poll costs about as much as its new events.       #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import pandas as pd
+from .http_client import get_url, fetch_json, api_url, html_report_url, loads
+from .cache import FINAL_GAME_STATES
+from .game_json import build_plays, build_roster
+from .html_report import GrowingReport, build_report
+from . import nhl_pbp_data_scraper as scraper
+############################################# Config ###################################################
+
+# Polls one game. A poll is a couple of conditional requests plus the work for the new plays: tokenizing the part of
+# the HTML report added since the last poll, and cleaning and merging the new plays. That's tens of milliseconds, not
+# the ~0.9 s a full report parse takes, so polling every 10-20 seconds (about how often the NHL updates its feeds)
+# is cheap. Everything poll() returns and frame() gives is final, shootout handling included
+class LiveGame:
+    def __init__(self, game_id):
+        self.game_id = game_id
+        # url -> headers to send on the next request to that url (If-None-Match / If-Modified-Since)
+        self.validators = {}
+        self.gamecenter = None
+        self.players_df = None
+        self.teams = None
+        # Tokenized html report, the report df built from it, and that df merged-ready for the current roster
+        self.report = GrowingReport()
+        self.report_df = None
+        self.html_df = None
+        self.game_state = None
+        self.game_json = None
+        # Plays up to this sortOrder have been processed. Plays after it get cleaned on the next poll
+        self.last_sort_order = -1
+        # event_num of the report rows already lined up with a play, and of the ones already reported as unmatched
+        # (see merge_report)
+        self.used_report_rows = set()
+        self.reported_report_rows = set()
+        # Goals from processed plays, carried into the score of the next plays
+        self.home_goals = 0
+        self.away_goals = 0
+        # Merged (but not column cleaned) plays, one df per poll. Joined when frame() is called
+        self.chunks = []
+        # Set once a shootout shot comes in. From then on the shootout handling is redone over every processed play
+        self.in_shootout = False
+        self.frame_cache = None
+
+    # Function to check if the game is over
+    def is_final(self):
+        return self.game_state in FINAL_GAME_STATES
+
+    # Function to poll the game. Returns a df (clean_columns format) of the plays that are new since the last
+    # poll, which is empty if nothing changed
+    def poll(self):
+        req = self.conditional_get(api_url("gamecenter/{}/play-by-play".format(self.game_id)), "Play-by-Play API")
+        if req is None:
+            return self.empty_frame()
+        if req.status_code == 304:
+            # Nothing new from the api, but plays still waiting on the html report might be on it now
+            if self.game_json is None:
+                return self.empty_frame()
+            game_json = self.game_json
+        else:
+            game_json = loads(req.text)
+            self.game_json = game_json
+        self.game_state = game_json.get('gameState')
+        new_plays = [play for play in game_json['plays'] if play['sortOrder'] > self.last_sort_order]
+        if not new_plays:
+            return self.empty_frame()
+        # Coaches, venue, etc don't change during a game, so the landing only gets fetched once
+        if self.gamecenter is None:
+            self.gamecenter = fetch_json(api_url("gamecenter/{}/landing".format(self.game_id)), "Gamecenter API", "landing", self.game_id)
+            if self.gamecenter is None:
+                return self.empty_frame()
+        # The roster can grow early in the game, so rebuild it when it changes size
+        if self.players_df is None or len(self.players_df) != len(game_json['rosterSpots']):
+            self.teams = scraper.get_teams(game_json)
+            self.players_df = scraper.clean_players(build_roster(game_json['rosterSpots']), self.teams)
+            # The report's event players were found with the old roster, so find them again
+            if self.report_df is not None:
+                self.html_df = scraper.clean_html_report(self.report_df.copy(), self.players_df)
+        self.update_html_report()
+        if self.html_df is None:
+            return self.empty_frame()
+        pbp = build_plays(new_plays)
+        pbp = scraper.apply_misc_info(pbp, self.gamecenter, self.game_id)
+        pbp['game_state'] = self.game_state
+        pbp = scraper.add_event_players(pbp, self.players_df)
+        pbp = scraper.add_event_team(pbp, self.teams, self.players_df)
+        pbp = scraper.add_total_goals(pbp)
+        # Carry the score forward from the plays we already have
+        pbp['home_score'] = pbp['home_score'] + self.home_goals
+        pbp['away_score'] = pbp['away_score'] + self.away_goals
+        pbp = scraper.parse_situation_code(pbp)
+        pbp = scraper.add_elapsed_time(pbp)
+        sort_orders = pbp['sortOrder']
+        goals = pbp[['sortOrder', 'isHomeGoal', 'isAwayGoal']]
+        merged = self.merge_report(pbp)
+        if len(merged) == 0:
+            # None of the new plays are on the html report yet. Try them again next poll
+            return self.empty_frame()
+        merged = scraper.add_on_ice_ids(merged, self.players_df)
+        # The html report lags the api. Anything after the last play that made it onto the report stays pending.
+        # Plays before it that didn't match won't ever match (the full scrape drops them too)
+        done_through = merged['sortOrder'].max()
+        done = goals[sort_orders <= done_through]
+        self.home_goals += int(done['isHomeGoal'].sum())
+        self.away_goals += int(done['isAwayGoal'].sum())
+        self.last_sort_order = done_through
+        self.chunks.append(merged)
+        self.in_shootout = self.in_shootout or bool((merged['strength_cat_rel'] == "shootout-shot").any())
+        if self.in_shootout:
+            # Shootout scores depend on the score after OT and who won, so they're worked out over every play so far.
+            # A shootout is only a few plays, so this is cheap
+            self.chunks = [scraper.add_shootout_logic(pd.concat(self.chunks, ignore_index=True))]
+            merged = self.chunks[0].iloc[len(self.chunks[0]) - len(merged):]
+        self.frame_cache = None
+        return scraper.clean_columns(merged.copy())
+
+    # Function to merge new plays onto the html report. They're only lined up with report rows no earlier poll used,
+    # so a play can't take the row of an earlier play in the same second. Rows that don't line up are reported as
+    # unmatched once, and only if they're before the newest play's second. Rows from then on can still line up with
+    # plays on a later poll
+    def merge_report(self, pbp):
+        free_rows = self.html_df[~self.html_df['event_num'].isin(self.used_report_rows)]
+        newest_period = pbp['period'].max()
+        newest_second = pbp.loc[pbp['period'] == newest_period, 'game_seconds_elapsed'].max()
+        waiting = (free_rows['period'] > newest_period) | ((free_rows['period'] == newest_period) & (free_rows['game_seconds_elapsed'] >= newest_second))
+        merged = scraper.merge_html_report(pbp, free_rows, skip_html=self.reported_report_rows | set(free_rows.loc[waiting, 'event_num']))
+        self.used_report_rows.update(merged['event_num'])
+        unmatched = free_rows.loc[~waiting, 'event_num']
+        self.reported_report_rows.update(unmatched[~unmatched.isin(self.used_report_rows)])
+        return merged
+
+    # Function to get every processed play so far, in clean_columns format
+    def frame(self):
+        if self.frame_cache is None:
+            if not self.chunks:
+                return self.empty_frame()
+            # Join the chunks so the next call doesn't have to
+            self.chunks = [pd.concat(self.chunks, ignore_index=True)]
+            self.frame_cache = scraper.clean_columns(self.chunks[0].copy())
+        return self.frame_cache
+
+    # Function to refresh the parsed html report, unless it hasn't changed since the last poll. Only the rows added
+    # since the last version get tokenized
+    def update_html_report(self):
+        url = html_report_url(self.gamecenter['season'], self.game_id)
+        req = self.conditional_get(url, "HTML Report")
+        if req is not None and req.status_code != 304:
+            self.report_df = build_report(self.report.update(req.text))
+            self.html_df = scraper.clean_html_report(self.report_df.copy(), self.players_df)
+
+    # Function to make a conditional GET. Remembers the ETag / Last-Modified of each url and sends them back,
+    # so unchanged responses come back as an empty 304
+    def conditional_get(self, url, source):
+        req = get_url(url, source, headers=self.validators.get(url))
+        if req is not None and req.status_code != 304:
+            headers = {}
+            if req.headers.get('ETag'):
+                headers['If-None-Match'] = req.headers['ETag']
+            if req.headers.get('Last-Modified'):
+                headers['If-Modified-Since'] = req.headers['Last-Modified']
+            self.validators[url] = headers
+        return req
+
+    # Function to get an empty df with the clean_columns columns
+    def empty_frame(self):
+        return pd.DataFrame(columns=scraper.CLEAN_COLUMNS)
@@ -0,0 +1,195 @@
+############################################## metrics.py ##############################################
+#                                                                                                      #
+#                                 Run metrics for the scraper. Every request, cleaning stage and       #
+#                                 html merge is counted in one shared Metrics object, which can be     #
+#                                 exported as json or in the Prometheus text format. Hooks get every   #
+#                                 event as it happens, for logging or sending somewhere else.          #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import functools
+import json
+import threading
+import time
+############################################# Config ###################################################
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_PREFIX = "nhl_scraper"
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Functions called with every event dict, see add_hook
+        self.hooks = []
+        self.reset()
+
+    # Function to clear every number. Hooks are kept
+    def reset(self):
+        with self.lock:
+            # source -> request numbers
+            self.requests = {}
+            # stage -> {"calls", "seconds", "max_seconds"}
+            self.stages = {}
+            # name -> value, ex games_scraped or html_merge_rows_out
+            self.counters = {}
+
+    # Function to add a hook. hook(event) gets called with a dict for every request, retry, cache hit, stage and
+    # counter, ex {"type": "request", "source": "HTML Report", "seconds": 0.31, "bytes": 1734280, "status": 200, "error": None}.
+    # Hooks run on the thread that did the work, so keep them quick
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            hook(event)
+
+    def request_numbers(self, source):
+        if source not in self.requests:
+            self.requests[source] = {"count": 0, "errors": 0, "retries": 0, "cache_hits": 0, "bytes": 0, "seconds": 0.0,
+                                     "max_seconds": 0.0, "buckets": [0] * len(LATENCY_BUCKETS), "statuses": {}}
+        return self.requests[source]
+
+    # Function to record a finished request (or one that failed, with error set to why)
+    def record_request(self, source, seconds, size=0, status=None, error=None):
+        with self.lock:
+            numbers = self.request_numbers(source)
+            numbers["count"] += 1
+            numbers["bytes"] += size
+            numbers["seconds"] += seconds
+            numbers["max_seconds"] = max(numbers["max_seconds"], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    numbers["buckets"][i] += 1
+                    break
+            if status is not None:
+                numbers["statuses"][str(status)] = numbers["statuses"].get(str(status), 0) + 1
+            if error is not None:
+                numbers["errors"] += 1
+        self.emit({"type": "request", "source": source, "seconds": seconds, "bytes": size, "status": status, "error": error})
+
+    # Function to record that a request is being tried again
+    def record_retry(self, source, attempt, wait):
+        with self.lock:
+            self.request_numbers(source)["retries"] += 1
+        self.emit({"type": "retry", "source": source, "attempt": attempt, "wait": wait})
+
+    # Function to record a response that came from the on-disk cache instead of the network
+    def record_cache_hit(self, source):
+        with self.lock:
+            self.request_numbers(source)["cache_hits"] += 1
+        self.emit({"type": "cache_hit", "source": source})
+
+    def record_stage(self, stage, seconds):
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0}
+            numbers = self.stages[stage]
+            numbers["calls"] += 1
+            numbers["seconds"] += seconds
+            numbers["max_seconds"] = max(numbers["max_seconds"], seconds)
+        self.emit({"type": "stage", "stage": stage, "seconds": seconds})
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        self.emit({"type": "counter", "name": name, "value": value})
+
+    # Function to get a copy of every number as plain dicts
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps({"requests": self.requests, "stages": self.stages, "counters": self.counters}))
+
+    # Function to add in the numbers from another snapshot, ex one sent back from a worker process
+    def merge(self, snapshot):
+        with self.lock:
+            for source, other in snapshot["requests"].items():
+                numbers = self.request_numbers(source)
+                for key in ["count", "errors", "retries", "cache_hits", "bytes", "seconds"]:
+                    numbers[key] += other[key]
+                numbers["max_seconds"] = max(numbers["max_seconds"], other["max_seconds"])
+                numbers["buckets"] = [a + b for a, b in zip(numbers["buckets"], other["buckets"])]
+                for status, count in other["statuses"].items():
+                    numbers["statuses"][status] = numbers["statuses"].get(status, 0) + count
+            for stage, other in snapshot["stages"].items():
+                numbers = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+                numbers["calls"] += other["calls"]
+                numbers["seconds"] += other["seconds"]
+                numbers["max_seconds"] = max(numbers["max_seconds"], other["max_seconds"])
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_json(self, indent=None):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    # Function to export in the Prometheus text format, ex for a textfile collector or a /metrics endpoint
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, about, samples):
+            lines.append("# HELP {}_{} {}".format(prefix, name, about))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+            for suffix, labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(key, escape_label(value)) for key, value in labels.items())
+                lines.append("{}_{}{}{} {}".format(prefix, name, suffix, "{" + label_text + "}" if label_text else "", value))
+
+        requests = snapshot["requests"]
+        metric("requests_total", "counter", "Requests made, by source.", [("", {"source": s}, n["count"]) for s, n in requests.items()])
+        metric("request_errors_total", "counter", "Requests that failed, by source.", [("", {"source": s}, n["errors"]) for s, n in requests.items()])
+        metric("request_retries_total", "counter", "Requests that were tried again, by source.", [("", {"source": s}, n["retries"]) for s, n in requests.items()])
+        metric("cache_hits_total", "counter", "Responses served from the on-disk cache, by source.", [("", {"source": s}, n["cache_hits"]) for s, n in requests.items()])
+        metric("response_bytes_total", "counter", "Bytes downloaded, by source.", [("", {"source": s}, n["bytes"]) for s, n in requests.items()])
+        metric("responses_total", "counter", "Responses, by source and HTTP status.",
+               [("", {"source": s, "status": status}, count) for s, n in requests.items() for status, count in n["statuses"].items()])
+        samples = []
+        for source, numbers in requests.items():
+            # Prometheus buckets are cumulative
+            total = 0
+            for bound, count in zip(LATENCY_BUCKETS, numbers["buckets"]):
+                total += count
+                samples.append(("_bucket", {"source": source, "le": str(bound)}, total))
+            samples.append(("_bucket", {"source": source, "le": "+Inf"}, numbers["count"]))
+            samples.append(("_sum", {"source": source}, numbers["seconds"]))
+            samples.append(("_count", {"source": source}, numbers["count"]))
+        metric("request_seconds", "histogram", "Request latency in seconds, by source.", samples)
+        samples = []
+        for stage, numbers in snapshot["stages"].items():
+            samples.append(("_sum", {"stage": stage}, numbers["seconds"]))
+            samples.append(("_count", {"stage": stage}, numbers["calls"]))
+        metric("stage_seconds", "summary", "Time spent in each scraping and cleaning stage.", samples)
+        for name, value in snapshot["counters"].items():
+            metric(name + "_total", "counter", name.replace("_", " ").capitalize() + ".", [("", {}, value)])
+        return "\n".join(lines) + "\n"
+
+# Function to escape a Prometheus label value
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# The shared metrics every part of the scraper records into
+metrics = Metrics()
+
+# Function to get the shared metrics
+def get_metrics():
+    return metrics
+
+# Function to swap in a different Metrics object. Returns the new one
+def set_metrics(new_metrics):
+    global metrics
+    metrics = new_metrics
+    return metrics
+
+# Decorator that records how long every call of a function takes, under the function's name
+def timed_stage(function):
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            metrics.record_stage(function.__name__, time.perf_counter() - start)
+    return timed
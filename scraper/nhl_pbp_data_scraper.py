@@ -11,115 +11,263 @@
 ########################################################################################################
 
 ######################################### Import Modules ###############################################
+import functools
+from collections import namedtuple
 import pandas as pd
-import requests
 import numpy as np
-from bs4 import BeautifulSoup as bs
+from .http_client import fetch_json, fetch_text, api_url, html_report_url
+from .cache import FINAL_GAME_STATES
+from .dtypes import compact_dtypes, concat_games, ON_ICE_COLUMNS, ON_ICE_ID_COLUMNS, EVENT_PLAYER_ID_COLUMNS
+from .metrics import Metrics, get_metrics, set_metrics, timed_stage
+from .align import align_events
+from .game_json import build_plays, build_roster
+from .html_report import parse_report, build_player_index, extract_event_primary_players
+from .pipeline import map_in_threads, iter_pipeline, FailedGame, DOWNLOAD_FAILED
+from .schedule import get_schedule_week, get_game_ids, get_season_game_ids, REGULAR_AND_PLAYOFFS
 ############################################# Config ###################################################
+# Columns in the df that gets returned, in order
+CLEAN_COLUMNS = ['game_id',"game_season",'game_date',"game_type","venue","home_team","away_team","home_coach","away_coach","period",
+                 'period_type',"period_minutes_elapsed","period_seconds_elapsed","game_minutes_elapsed","game_seconds_elapsed",
+                 "event","event_team",'shot_type',"description",'x_coordinate','y_coordinate','zone','is_shot_on_empty_net_rel',
+                 'home_team_def_side','home_score','away_score',"event_primary_player",'event_secondary_player','event_tertiary_player','situation_code',
+                 'home_skaters_on_ice','away_skaters_on_ice','home_goalie_on_ice','away_goalie_on_ice','strength','strength_rel',
+                 'strength_cat_rel','home_skater1', 'home_skater2','home_skater3', 'home_skater4', 'home_skater5','home_skater6',
+                 'home_goalie','away_skater1', 'away_skater2', 'away_skater3', 'away_skater4','away_skater5','away_skater6','away_goalie'] + ON_ICE_ID_COLUMNS + EVENT_PLAYER_ID_COLUMNS
+# Columns that only come from the html report, the landing endpoint, and the event player stage
+HTML_COLUMNS = ["description"] + ON_ICE_COLUMNS + ON_ICE_ID_COLUMNS
+LANDING_COLUMNS = ["home_coach","away_coach"]
+PLAYER_COLUMNS = ["event_primary_player","event_secondary_player","event_tertiary_player"] + EVENT_PLAYER_ID_COLUMNS
+# What a set of columns needs. html and landing say if those downloads are needed, players if the event player stage is
+ColumnPlan = namedtuple("ColumnPlan", ["columns", "html", "landing", "players"])
 
-# Function to scrape games from a certain date
-def scrape_date(date):
+# Function to scrape games from a certain date. Set workers > 1 to scrape that many games at once.
+# Pass a ParquetStore as store to skip games that are already stored and write the new ones to it.
+# Set processes to parse and clean games in that many processes (see iter_games). Pass a list of columns to only get
+# those, which skips the downloads and stages they don't need (see plan_columns)
+def scrape_date(date, workers=1, store=None, processes=None, columns=None):
     print("Scraping games from {}...\n".format(date))
     # Make request to days schedule. Example URL: https://api-web.nhle.com/v1/schedule/2023-11-30
-    try:
-        req = requests.get("https://api-web.nhle.com/v1/schedule/{}".format(date))
-        req.raise_for_status() 
-    # Handle any exception related to the request
-    except requests.exceptions.RequestException as req_exc:
-        print(f"Play-by-Play API request failed: {req_exc}")
-    # Handle HTTP errors
-    except requests.exceptions.HTTPError as http_err:
-        print(f"Play-by-Play API HTTP error occurred: {http_err}")
-    # Handle value-related issues
-    except ValueError as val_err:
-        print(f"Play-by-Play API Value error occured: {val_err}")
-    else:
-        games = pd.json_normalize(req.json()['gameWeek'][0]['games'])['id'].tolist()
-        pbp_df = pd.DataFrame()
-        for game in games:
-            game_pbp = scrape_game(game)
-            pbp_df = pd.concat([pbp_df,game_pbp])
+    schedule = get_schedule_week(date)
+    if schedule is None:
+        # Whatever went wrong was printed (and recorded in the metrics) when it happened
+        print("{} failed.".format(date))
+        return pd.DataFrame()
+    games = [game['id'] for game in schedule['gameWeek'][0]['games']]
+    pbp_df = scrape_games(games, workers, store, processes, columns)
     print("{} Finished.".format(date))
     return pbp_df
 
-# Function to scrape single game
-def scrape_game(game_id):
+# Function to scrape every finished game between two dates (inclusive). Dates are formatted YYYY-MM-DD.
+# game_types can limit it to certain game types, ex (2,3) for regular season and playoffs
+def scrape_range(start, end, game_types=None, workers=1, store=None, processes=None, columns=None):
+    print("Scraping games from {} to {}...\n".format(start, end))
+    games = get_game_ids(start, end, game_types=game_types)
+    pbp_df = scrape_games(games, workers, store, processes, columns)
+    print("{} to {} Finished.".format(start, end))
+    return pbp_df
+
+# Function to scrape every finished game from a season. Season is formatted like the API, ex 20232024
+def scrape_season(season, game_types=REGULAR_AND_PLAYOFFS, workers=1, store=None, processes=None, columns=None):
+    print("Scraping games from the {} season...\n".format(season))
+    games = get_season_game_ids(season, game_types=game_types)
+    pbp_df = scrape_games(games, workers, store, processes, columns)
+    print("{} season Finished.".format(season))
+    return pbp_df
+
+# Function to scrape a list of games into one df. Set workers > 1 to scrape that many games at once.
+# With a store, games it already has are skipped and the rest are written to it as they finish
+def scrape_games(games, workers=1, store=None, processes=None, columns=None):
+    game_pbps = list(iter_games(games, workers, store=store, processes=processes, columns=columns))
+    # One concat at the end, rather than re-copying the growing df for every game
+    if not game_pbps:
+        return pd.DataFrame()
+    return concat_games(game_pbps)
+
+# Function to scrape games one at a time, yielding each cleaned game's df as soon as it's ready (in the order given),
+# so only a few games are held in memory at once. batch_size yields that many games joined together instead.
+# With a store, games it already has are skipped and the rest are written to it. Set processes to parse and clean
+# games in that many processes, while workers threads download them (see pipeline.py). columns picks the columns
+# to return, like scrape_date
+def iter_games(games, workers=1, batch_size=None, store=None, processes=None, columns=None):
+    if store is not None:
+        # The store partitions on these, so they have to come along
+        if columns is not None:
+            columns = list(columns) + [column for column in ["game_id","game_season","game_type"] if column not in columns]
+        stored = [game for game in games if store.has_game(game)]
+        if stored:
+            print("Skipping {} games that are already stored".format(len(stored)))
+        games = [game for game in games if not store.has_game(game)]
+    # Check the columns now, rather than in every game
+    plan_columns(columns)
+    if processes:
+        game_pbps = iter_processed_games(games, workers, processes, columns)
+    else:
+        game_pbps = map_in_threads(functools.partial(scrape_game, columns=columns), games, workers)
+    batch = []
+    for game_pbp in game_pbps:
+        # Failed games come back empty. Nothing to keep
+        if len(game_pbp) == 0:
+            continue
+        if store is not None:
+            store.write(game_pbp)
+        if batch_size is None:
+            yield game_pbp
+            continue
+        batch.append(game_pbp)
+        if len(batch) >= batch_size:
+            yield concat_games(batch)
+            batch = []
+    if batch:
+        yield concat_games(batch)
+
+# Function to run games through the fetch -> parse pipeline, adding the metrics recorded in the worker
+# processes into this process's metrics as each game comes back. Games that couldn't be fetched are printed and
+# come back empty, like scrape_game does
+def iter_processed_games(games, workers, processes, columns=None):
+    fetch = functools.partial(fetch_game, columns=columns)
+    for result in iter_pipeline(games, fetch, parse_game_with_metrics, fetch_workers=workers, parse_workers=processes):
+        if isinstance(result, FailedGame):
+            # fetch_game already counted the ones that came back None
+            if result.error != DOWNLOAD_FAILED:
+                get_metrics().increment("games_failed")
+            print("Game {} failed: {}\n".format(result.game_id, result.error))
+            yield pd.DataFrame(columns=plan_columns(columns).columns)
+            continue
+        game_pbp, worker_metrics = result
+        get_metrics().merge(worker_metrics)
+        yield game_pbp
+
+# Function to stream games into a sink (see sinks.py), ex CsvSink("pbp.csv"). Returns the number of rows written
+def scrape_to_sink(games, sink, workers=1, batch_size=None, store=None, processes=None, columns=None):
+    rows = 0
+    try:
+        for pbp_df in iter_games(games, workers, batch_size, store, processes, columns):
+            sink.write(pbp_df)
+            rows += len(pbp_df)
+    finally:
+        sink.close()
+    return rows
+
+# Function to scrape single game. Pass a list of columns to only get those (see plan_columns)
+def scrape_game(game_id, columns=None):
     print("Scraping game {}...".format(game_id))
+    payloads = fetch_game(game_id, columns)
+    if payloads is None:
+        # Couldn't get everything we need for this game. Whatever failed was printed when it happened
+        print("Game {} failed.\n".format(game_id))
+        return pd.DataFrame(columns=plan_columns(columns).columns)
+    pbp = parse_game(payloads)
+    print("Game {} finished.\n".format(game_id))
+    return pbp
+
+# Function to work out what it takes to make a set of columns. None means every column in CLEAN_COLUMNS.
+# Raises a ValueError for columns we don't have
+def plan_columns(columns=None):
+    if columns is None:
+        return ColumnPlan(CLEAN_COLUMNS, True, True, True)
+    columns = list(columns)
+    unknown = [column for column in columns if column not in CLEAN_COLUMNS]
+    if unknown:
+        raise ValueError("Unknown columns: {}. Pick from CLEAN_COLUMNS".format(", ".join(map(str, unknown))))
+    html = any(column in HTML_COLUMNS for column in columns)
+    landing = any(column in LANDING_COLUMNS for column in columns)
+    # The html merge lines events up by their player, so it needs them too
+    players = html or any(column in PLAYER_COLUMNS for column in columns)
+    return ColumnPlan(columns, html, landing, players)
+
+# Function to download everything a game needs: the play-by-play and landing json, and the html report.
+# The landing and html report are skipped if the columns don't need them (their payloads are None then).
+# Returns a dict of the raw payloads, or None if any of them failed
+@timed_stage
+def fetch_game(game_id, columns=None):
+    plan = plan_columns(columns)
     # Make request. New URL example is https://api-web.nhle.com/v1/gamecenter/2023020061/play-by-play
-    try:
-        req = requests.get("https://api-web.nhle.com/v1/gamecenter/{}/play-by-play".format(game_id))  
-        req.raise_for_status() 
-    # Handle any exception related to the request
-    except requests.exceptions.RequestException as req_exc:
-        print(f"Play-by-Play API request failed: {req_exc}")
-    # Handle HTTP errors
-    except requests.exceptions.HTTPError as http_err:
-        print(f"Play-by-Play API HTTP error occurred: {http_err}")
-    # Handle value-related issues
-    except ValueError as val_err:
-        print(f"Play-by-Play API Value error occured: {val_err}")
-    else:
-         # Get PBP and transform into df
-        # Full df is the entire json resp. includes some general game info
-        full_df = pd.json_normalize(req.json())
-        # pbp df is every event in the game
-        pbp = pd.json_normalize(full_df['plays'][0])
-        # players df is every player that played in the game
-        players_df = pd.json_normalize(full_df['rosterSpots'][0])
-        # teams
-        teams = get_teams(full_df)
-        # Add misc. info to pbp
-        pbp = add_misc_info(pbp,full_df,game_id)
-        # Clean each df
-        # Clean players
-        players_df = clean_players(players_df,teams)
-        # Clean pbp
-        pbp = clean_pbp(pbp,players_df,teams)
-        print("Game {} finished.\n".format(game_id))
+    game_json = fetch_json(api_url("gamecenter/{}/play-by-play".format(game_id)),"Play-by-Play API","play-by-play",game_id)
+    if game_json is None:
+        get_metrics().increment("games_failed")
+        return None
+    payloads = {"game_id":game_id,"play-by-play":game_json,"landing":None,"html-report":None,"columns":plan.columns}
+    if plan.landing:
+        #For tons more of misc info not on the regualr pbp endpoint go to https://api-web.nhle.com/v1/gamecenter/2022030237/landing
+        payloads['landing'] = fetch_json(api_url("gamecenter/{}/landing".format(game_id)),"Gamecenter API","landing",game_id)
+        if payloads['landing'] is None:
+            get_metrics().increment("games_failed")
+            return None
+    if plan.html:
+        # URL example: https://www.nhl.com/scores/htmlreports/20232024/PL010035.HTM
+        # Finished games never change, so their report can be cached
+        payloads['html-report'] = fetch_text(html_report_url(game_json['season'],game_id),"HTML Report","html-report",game_id,
+                                             final=game_json['gameState'] in FINAL_GAME_STATES)
+        if payloads['html-report'] is None:
+            get_metrics().increment("games_failed")
+            return None
+    return payloads
+
+# Function to parse a game in a worker process. Records into a fresh Metrics object and sends its numbers back with
+# the df, since the worker's metrics aren't the ones in the main process
+def parse_game_with_metrics(payloads):
+    worker_metrics = set_metrics(Metrics())
+    pbp = parse_game(payloads)
+    return pbp, worker_metrics.snapshot()
+
+# Function to turn a game's raw payloads (from fetch_game) into the cleaned pbp df. Doesn't touch the network,
+# so it can run anywhere, like in another process
+@timed_stage
+def parse_game(payloads):
+    game_id = payloads['game_id']
+    game_json = payloads['play-by-play']
+    # pbp df is every event in the game (see game_json.py for the columns)
+    pbp = build_plays(game_json['plays'])
+    # players df is every player that played in the game
+    players_df = build_roster(game_json['rosterSpots'])
+    # teams
+    teams = get_teams(game_json)
+    # Add misc. info to pbp. Everything but the coaches is on the pbp json too, so it's used when the landing wasn't needed
+    pbp = apply_misc_info(pbp,payloads['landing'] or payloads['play-by-play'],game_id)
+    # Clean each df
+    # Clean players
+    players_df = clean_players(players_df,teams)
+    # Clean pbp
+    pbp = clean_pbp(pbp,players_df,teams,payloads['html-report'],payloads.get('columns'))
+    get_metrics().increment("games_scraped")
+    get_metrics().increment("rows_scraped", len(pbp))
     return pbp
 
-# Add in lots of misc info that we need to get from not just the pbp frame. Coaches, etc
-def add_misc_info(pbp,full_df,game_id):
-    #For tons more of misc info not on the regualr pbp endpoint go to https://api-web.nhle.com/v1/gamecenter/2022030237/landing
-    try:
-        req = requests.get("https://api-web.nhle.com/v1/gamecenter/{}/landing".format(game_id))
-        req.raise_for_status() 
-    except requests.exceptions.RequestException as req_exc:
-        print(f"Gamecenter API request failed: {req_exc}")
-    # Handle HTTP errors
-    except requests.exceptions.HTTPError as http_err:
-        print(f"Gamecenter API HTTP error occurred: {http_err}")
-    # Handle value-related issues
-    except ValueError as val_err:
-        print(f"Gamecenter API Value error occured: {val_err}")
-    else:
-        gamecenter = req.json()
-        pbp['home_team'] = gamecenter['homeTeam']['abbrev']
-        pbp['away_team'] = gamecenter['awayTeam']['abbrev']
-        pbp['season'] = gamecenter['season']
-        pbp['game_type'] = gamecenter['gameType']
-        pbp['game_date'] = gamecenter['gameType']
-        pbp['venue'] = gamecenter['venue']['default']
+# Function to add the misc info from an already fetched landing response
+@timed_stage
+def apply_misc_info(pbp,gamecenter,game_id):
+    pbp['home_team'] = gamecenter['homeTeam']['abbrev']
+    pbp['away_team'] = gamecenter['awayTeam']['abbrev']
+    pbp['season'] = gamecenter['season']
+    pbp['game_type'] = gamecenter['gameType']
+    pbp['game_date'] = gamecenter['gameType']
+    pbp['venue'] = gamecenter['venue']['default']
+    # Only the landing has the coaches
+    if 'summary' in gamecenter:
         pbp['home_coach']  = gamecenter['summary']['gameInfo']['homeTeam']['headCoach']['default'].upper()
         pbp['away_coach'] = gamecenter['summary']['gameInfo']['awayTeam']['headCoach']['default'].upper()
-        pbp['game_id'] = game_id
+    pbp['game_id'] = game_id
+    # Used to decide if the html report can be cached
+    pbp['game_state'] = gamecenter['gameState']
     return pbp
 
-# Function to get home and away team
-def get_teams(full_df):
+# Function to get home and away team from the play-by-play json. Team id -> abbreviation
+def get_teams(game_json):
     teams = {}
-    home_id = full_df.iloc[0]['homeTeam.id']
-    home_abv = full_df.iloc[0]['homeTeam.abbrev']
-    away_id = full_df.iloc[0]['awayTeam.id']
-    away_abv = full_df.iloc[0]['awayTeam.abbrev']
+    home_id = game_json['homeTeam']['id']
+    home_abv = game_json['homeTeam']['abbrev']
+    away_id = game_json['awayTeam']['id']
+    away_abv = game_json['awayTeam']['abbrev']
     teams[home_id]=home_abv
     teams[away_id]=away_abv
     return teams
 
-# Function to clean the pbp df that will return
-def clean_pbp(pbp_df,players_df,teams):
+# Function to clean the pbp df that will return. If html_doc isn't given, the html report gets downloaded
+def clean_pbp(pbp_df,players_df,teams,html_doc=None,columns=None):
+    plan = plan_columns(columns)
     # Add p1 id, p2 id, p3 mid
-    pbp_df = add_event_players(pbp_df,players_df)
+    if plan.players:
+        pbp_df = add_event_players(pbp_df,players_df)
     # Add teams
     pbp_df = add_event_team(pbp_df,teams,players_df)
     # Add total goals
@@ -128,15 +276,24 @@ def clean_pbp(pbp_df,players_df,teams):
     pbp_df = parse_situation_code(pbp_df)
     # Add total elapsed time
     pbp_df = add_elapsed_time(pbp_df)
-    #Add html pbp data. Need this for description and which players were on ice for each event
-    pbp_df = add_html_report_data(pbp_df,players_df)
+    #Add html pbp data. Need this for description and which players were on ice for each event. Without it every api
+    # play is kept, including the few the html report doesn't have
+    if not plan.html:
+        pbp_df = rename_events(pbp_df)
+    elif html_doc is None:
+        pbp_df = add_html_report_data(pbp_df,players_df)
+    else:
+        pbp_df = merge_html_report(pbp_df,parse_html_report(html_doc,players_df))
+    if plan.html:
+        pbp_df = add_on_ice_ids(pbp_df,players_df)
     #Add shootout logic. Do this because shootouts provde some intersting challenges
     pbp_df = add_shootout_logic(pbp_df)
     #Clean columns
-    pbp_df = clean_columns(pbp_df)
+    pbp_df = clean_columns(pbp_df,plan.columns)
     return pbp_df
 
 # Function to clean the players df to be used throughout the scraper
+@timed_stage
 def clean_players(players_df,teams):
     players_df['team'] = players_df['teamId'].map(teams)
     players_df['player'] = players_df['firstName.default'].str.upper() + " " + players_df['lastName.default'].str.upper()
@@ -144,33 +301,32 @@ def clean_players(players_df,teams):
     players_df = players_df.rename(columns={"playerId":"player_id","teamId":"team_id","sweaterNumber":"sweater_number","positionCode":"position"})
     return players_df
 
-# Function to add players to the event action columns
+# Function to add players to the event action columns. Each event type mask is built once, then every id column
+# is picked in one pass
+@timed_stage
 def add_event_players(pbp_df,players_df):
-    #Goals
-    #frst, check if columns exist. There is no guarentee a non-so goal will be scored, and if thats the case
-    # we will not have the assistPlayerId columns. So we have to check for that
-    pbp_df = check_columns(pbp_df)
-    pbp_df.loc[pbp_df['typeDescKey']=="goal",'event_primary_id'] = pbp_df['details.scoringPlayerId']
-    pbp_df.loc[pbp_df['typeDescKey']=="goal",'event_secondary_id'] = pbp_df['details.assist1PlayerId']
-    pbp_df.loc[pbp_df['typeDescKey']=="goal",'event_tertiary_id'] = pbp_df['details.assist2PlayerId']
+    #Goals. Every details column is there even if no play has it, ex the assists in a game without a goal (see game_json.py)
+    event = pbp_df['typeDescKey']
+    is_goal = (event=="goal").to_numpy()
     #SOGs, Misses, failed shots, blocks
-    pbp_df.loc[(pbp_df['typeDescKey']=="shot-on-goal")|(pbp_df['typeDescKey']=="missed-shot")|(pbp_df['typeDescKey']=="failed-shot-attempt")|(pbp_df['typeDescKey']=="blocked-shot"),'event_primary_id'] = pbp_df['details.shootingPlayerId']
-    #Hits
-    pbp_df.loc[pbp_df['typeDescKey']=="hit","event_primary_id"] = pbp_df['details.hittingPlayerId']
-    pbp_df.loc[pbp_df['typeDescKey']=="hit","event_secondary_id"] = pbp_df['details.hitteePlayerId']
-    #Faceoffs
-    pbp_df.loc[pbp_df['typeDescKey']=="faceoff","event_primary_id"] = pbp_df['details.winningPlayerId']
-    pbp_df.loc[pbp_df['typeDescKey']=="faceoff","event_secondary_id"] = pbp_df['details.losingPlayerId']
-    #Blocking player
-    pbp_df.loc[pbp_df['typeDescKey']=="blocked-shot","event_secondary_id"] = pbp_df['details.blockingPlayerId']
+    is_shot = event.isin(["shot-on-goal","missed-shot","failed-shot-attempt","blocked-shot"]).to_numpy()
+    is_hit = (event=="hit").to_numpy()
+    is_faceoff = (event=="faceoff").to_numpy()
+    is_block = (event=="blocked-shot").to_numpy()
     #Gives, takes
-    pbp_df.loc[(pbp_df['typeDescKey']=="giveaway")|(pbp_df['typeDescKey']=="takeaway"),"event_primary_id"] = pbp_df['details.playerId']
-    #Penalty
-    pbp_df.loc[pbp_df['typeDescKey']=="penalty","event_primary_id"] = pbp_df['details.committedByPlayerId']
-    pbp_df.loc[pbp_df['typeDescKey']=="penalty","event_secondary_id"] = pbp_df['details.drawnByPlayerId']
-    #If its a team penalty, check served by player id?
-    pbp_df.loc[(pbp_df['typeDescKey']=="penalty")&(pbp_df['details.servedByPlayerId'].isna()),"event_primary_id"] = pbp_df['details.committedByPlayerId']
-    pbp_df.loc[(pbp_df['typeDescKey']=="penalty")&(pbp_df['details.servedByPlayerId'].isna()==False),"event_primary_id"] = pbp_df['details.servedByPlayerId']
+    is_give_take = event.isin(["giveaway","takeaway"]).to_numpy()
+    is_penalty = (event=="penalty").to_numpy()
+    details = lambda column: pbp_df['details.{}'.format(column)].to_numpy(dtype=float)
+    #If its a team penalty, the player who served it is the event player
+    served = details('servedByPlayerId')
+    penalty_player = np.where(np.isnan(served),details('committedByPlayerId'),served)
+    pbp_df['event_primary_id'] = np.select([is_goal,is_shot,is_hit,is_faceoff,is_give_take,is_penalty],
+                                           [details('scoringPlayerId'),details('shootingPlayerId'),details('hittingPlayerId'),
+                                            details('winningPlayerId'),details('playerId'),penalty_player],np.nan)
+    pbp_df['event_secondary_id'] = np.select([is_goal,is_hit,is_faceoff,is_block,is_penalty],
+                                             [details('assist1PlayerId'),details('hitteePlayerId'),details('losingPlayerId'),
+                                              details('blockingPlayerId'),details('drawnByPlayerId')],np.nan)
+    pbp_df['event_tertiary_id'] = np.where(is_goal,details('assist2PlayerId'),np.nan)
     #Dict of games players
     games_players = dict(zip(players_df['player_id'], players_df['player']))
     pbp_df['event_primary_player'] = pbp_df['event_primary_id'].map(games_players)
@@ -178,20 +334,8 @@ def add_event_players(pbp_df,players_df):
     pbp_df['event_tertiary_player'] = pbp_df['event_tertiary_id'].map(games_players)
     return pbp_df
 
-# Function to check if all detail columns are present
-def check_columns(pbp_df):
-    cols = pbp_df.columns.tolist()
-    needed = ['details.assist1PlayerId','details.assist2PlayerId','details.committedByPlayerId','details.drawnByPlayerId','details.servedByPlayerId',
-              'details.blockingPlayerId','details.hittingPlayerId','details.hitteePlayerId','details.shootingPlayerId','details.scoringPlayerId',
-              'details.playerId','details.winningPlayerId','details.losingPlayerId']
-        # Find items in list1 but not in list2
-    difference = set(needed) - set(cols)
-    # Convert the result back to a list
-    result = list(difference)
-    pbp_df[result] = np.nan
-    return pbp_df
-
 # Function to add event team to df
+@timed_stage
 def add_event_team(pbp_df,teams,players_df):
     # The pbp data gives the event owner ID to the blocker rather than the shooter for blocked shots. We need to change that
     players_dict = dict(zip(players_df['player_id'], players_df['team_id']))
@@ -202,18 +346,18 @@ def add_event_team(pbp_df,teams,players_df):
     return pbp_df
 
 # Function to add total goals at the time of each event
+@timed_stage
 def add_total_goals(pbp_df):
-    pbp_df['isHomeGoal']=0
-    pbp_df['isAwayGoal']=0
-    pbp_df.loc[((pbp_df['typeDescKey']=="goal")&(pbp_df['event_team']==pbp_df['home_team'])),"isHomeGoal"] = 1
-    pbp_df.loc[((pbp_df['typeDescKey']=="goal")&(pbp_df['event_team']==pbp_df['away_team'])),"isAwayGoal"] = 1
-    pbp_df['away_score'] = pbp_df['isAwayGoal'].cumsum()
-    pbp_df['home_score'] = pbp_df['isHomeGoal'].cumsum()
-    pbp_df.loc[((pbp_df['typeDescKey']=="goal")&(pbp_df['event_team']==pbp_df['home_team'])),'home_score'] = pbp_df['home_score']-1
-    pbp_df.loc[((pbp_df['typeDescKey']=="goal")&(pbp_df['event_team']==pbp_df['away_team'])),'away_score'] = pbp_df['away_score']-1
+    is_goal = pbp_df['typeDescKey']=="goal"
+    pbp_df['isHomeGoal'] = (is_goal&(pbp_df['event_team']==pbp_df['home_team'])).astype(int)
+    pbp_df['isAwayGoal'] = (is_goal&(pbp_df['event_team']==pbp_df['away_team'])).astype(int)
+    # The score on a goal is the score before it went in, so take that goal back out of the running total
+    pbp_df['away_score'] = pbp_df['isAwayGoal'].cumsum() - pbp_df['isAwayGoal']
+    pbp_df['home_score'] = pbp_df['isHomeGoal'].cumsum() - pbp_df['isHomeGoal']
     return pbp_df
 
 # Function to parse situation code
+@timed_stage
 def parse_situation_code(pbp_df):
     # The situation code is a 4 digit number formatted as follows:
     # AG,AS,HS,HG
@@ -223,33 +367,49 @@ def parse_situation_code(pbp_df):
     # HG -Home goalie on ice (1 yes, 0 no)
     #Add in base case
     pbp_df.loc[pbp_df['situationCode'].isna(),'situationCode'] = "0000"
-    pbp_df['home_goalie_on_ice'] = pbp_df['situationCode'].str[3].astype(int)
-    pbp_df['away_goalie_on_ice'] = pbp_df['situationCode'].str[0].astype(int)
-    pbp_df['home_skaters_on_ice'] = pbp_df['situationCode'].str[2].astype(int)
-    pbp_df['away_skaters_on_ice'] = pbp_df['situationCode'].str[1].astype(int)
-    # We can extract some good info from these
-    pbp_df['strength'] = pbp_df['situationCode'].str[1] + "v" + pbp_df['situationCode'].str[2]
-    pbp_df.loc[pbp_df['event_team']==pbp_df['home_team'],"strength_rel"] = pbp_df['situationCode'].str[2] + "v" + pbp_df['situationCode'].str[1]
-    pbp_df.loc[pbp_df['event_team']==pbp_df['away_team'],"strength_rel"] = pbp_df['situationCode'].str[1] + "v" + pbp_df['situationCode'].str[2]
-    pbp_df.loc[pbp_df['home_skaters_on_ice']==pbp_df['away_skaters_on_ice'],"strength_cat_rel"] = "even"
+    code = pbp_df['situationCode'].astype(str)
+    # Decode each digit with math instead of slicing strings
+    code_number = code.astype(int).to_numpy()
+    away_goalie = code_number//1000
+    away_skaters = code_number//100%10
+    home_skaters = code_number//10%10
+    home_goalie = code_number%10
+    pbp_df['home_goalie_on_ice'] = home_goalie
+    pbp_df['away_goalie_on_ice'] = away_goalie
+    pbp_df['home_skaters_on_ice'] = home_skaters
+    pbp_df['away_skaters_on_ice'] = away_skaters
+    # We can extract some good info from these. There are only a handful of different codes in a game,
+    # so build the strings once per code and map them
+    unique_codes = code.unique()
+    pbp_df['strength'] = code.map({c:c[1]+"v"+c[2] for c in unique_codes})
+    is_home_event = (pbp_df['event_team']==pbp_df['home_team']).to_numpy()
+    is_away_event = (pbp_df['event_team']==pbp_df['away_team']).to_numpy()
+    strength_rel = np.full(len(pbp_df),np.nan,dtype=object)
+    strength_rel[is_home_event] = code[is_home_event].map({c:c[2]+"v"+c[1] for c in unique_codes})
+    strength_rel[is_away_event] = code[is_away_event].map({c:c[1]+"v"+c[2] for c in unique_codes})
+    pbp_df['strength_rel'] = strength_rel
+    # Later categories win, same as the order they were assigned in
+    strength_cat = np.full(len(pbp_df),np.nan,dtype=object)
+    strength_cat[home_skaters==away_skaters] = "even"
     # is advantage
-    pbp_df.loc[(pbp_df['home_skaters_on_ice']>pbp_df['away_skaters_on_ice'])&(pbp_df['event_team']==pbp_df['home_team']),"strength_cat_rel"] = "advantage"
-    pbp_df.loc[(pbp_df['away_skaters_on_ice']>pbp_df['home_skaters_on_ice'])&(pbp_df['event_team']==pbp_df['away_team']),"strength_cat_rel"] = "advantage"
+    strength_cat[((home_skaters>away_skaters)&is_home_event)|((away_skaters>home_skaters)&is_away_event)] = "advantage"
     # is short handed
-    pbp_df.loc[(pbp_df['home_skaters_on_ice']<pbp_df['away_skaters_on_ice'])&(pbp_df['event_team']==pbp_df['home_team']),"strength_cat_rel"] = "short-handed"
-    pbp_df.loc[(pbp_df['away_skaters_on_ice']<pbp_df['home_skaters_on_ice'])&(pbp_df['event_team']==pbp_df['away_team']),"strength_cat_rel"] = "short-handed"
-    # is penalty shot
-    pbp_df.loc[(((pbp_df['situationCode'].astype(str)=="1010")|(pbp_df['situationCode'].astype(str)=="0101"))&((pbp_df['period']!=5)&(pbp_df['game_type']!=3))),"strength_cat_rel"] = "penalty-shot"
-    pbp_df.loc[(((pbp_df['situationCode'].astype(str)=="1010")|(pbp_df['situationCode'].astype(str)=="0101"))&((pbp_df['game_type']==3))),"strength_cat_rel"] = "penalty-shot"
-    # is shootout
-    pbp_df.loc[(((pbp_df['situationCode'].astype(str)=="1010")|(pbp_df['situationCode'].astype(str)=="0101"))&((pbp_df['period']==5)&(pbp_df['game_type']!=3))),"strength_cat_rel"] = "shootout-shot"
+    strength_cat[((home_skaters<away_skaters)&is_home_event)|((away_skaters<home_skaters)&is_away_event)] = "short-handed"
+    # is penalty shot, or a shootout shot in a regular season shootout
+    is_one_on_one = code.isin(["1010","0101"]).to_numpy()
+    is_shootout = ((pbp_df['period']==5)&(pbp_df['game_type']!=3)).to_numpy()
+    strength_cat[is_one_on_one&~is_shootout] = "penalty-shot"
+    strength_cat[is_one_on_one&is_shootout] = "shootout-shot"
+    pbp_df['strength_cat_rel'] = strength_cat
     # We can make an is shot on empty net metric
-    pbp_df.loc[(pbp_df['typeDescKey']=='shot-on-goal')|(pbp_df['typeDescKey']=="missed-shot")|(pbp_df['typeDescKey']=="blocked-shot")|(pbp_df['typeDescKey']=="goal"),"is_shot_on_empty_net_rel"] = 0
-    pbp_df.loc[((pbp_df['situationCode'].str[0]=="0")&(pbp_df['event_team']==pbp_df['home_team'])&((pbp_df['typeDescKey']=='shot-on-goal')|(pbp_df['typeDescKey']=="missed-shot")|(pbp_df['typeDescKey']=="blocked-shot")|(pbp_df['typeDescKey']=="goal"))),"is_shot_on_empty_net_rel"] = 1
-    pbp_df.loc[((pbp_df['situationCode'].str[3]=="0")&(pbp_df['event_team']==pbp_df['away_team'])&((pbp_df['typeDescKey']=='shot-on-goal')|(pbp_df['typeDescKey']=="missed-shot")|(pbp_df['typeDescKey']=="blocked-shot")|(pbp_df['typeDescKey']=="goal"))),"is_shot_on_empty_net_rel"] = 1
+    is_shot = pbp_df['typeDescKey'].isin(['shot-on-goal',"missed-shot","blocked-shot","goal"]).to_numpy()
+    empty_net = np.where(is_shot,0.0,np.nan)
+    empty_net[is_shot&(((away_goalie==0)&is_home_event)|((home_goalie==0)&is_away_event))] = 1
+    pbp_df['is_shot_on_empty_net_rel'] = empty_net
     return pbp_df
 
 # Function to get elapsed time from the timeInPeriod field
+@timed_stage
 def add_elapsed_time(pbp_df):
     pbp_df['period_seconds_elapsed'] = pbp_df['timeInPeriod'].str[:2].astype(int)*60 +  pbp_df['timeInPeriod'].str[3:].astype(int)
     pbp_df['period_minutes_elapsed'] = pbp_df['period_seconds_elapsed']/60
@@ -262,113 +422,114 @@ def add_elapsed_time(pbp_df):
 def add_html_report_data(pbp_df, players_df):
     # URL example: https://www.nhl.com/scores/htmlreports/20232024/PL010035.HTM
     season = pbp_df.iloc[0]['season']
-    trimmed_game_id = str(pbp_df.iloc[0]['game_id'])[5:]
-    try:
-        req = requests.get("https://www.nhl.com/scores/htmlreports/{}/PL0{}.HTM".format(season,trimmed_game_id))
-        req.raise_for_status() 
-    except requests.exceptions.RequestException as req_exc:
-        print(f"HTML Report request failed: {req_exc}")
-    # Handle HTTP errors
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTML Report HTTP error occurred: {http_err}")
-    # Handle value-related issues
-    except ValueError as val_err:
-        print(f"HTML Report Value error occured: {val_err}")
-    else:
-        # adding this here. The api recogized failed so attempts as their own event where as the html pbp does not. Making this simple change
-        pbp_df.loc[pbp_df['typeDescKey']=="failed-shot-attempt",'typeDescKey'] = "missed-shot"
-        html_doc = req.text
-        soup = bs(html_doc, 'html.parser')
-        # this is how we select the rows of the html report. They are all elements with the class *=bborder
-        td_elements = soup.select('td[class*=bborder]')
-        # td_elements is an array of each td object that we found
-        # every 8 items in this array = 1 row on the html pbp report, so we need to group by every
-        # 8 elements in the array using this logic
-        chunk_size = 8
-        rows = []
-        for i in range(0, len(td_elements), chunk_size):
-            chunk = td_elements[i:i + chunk_size]
-            rows.append(chunk)
-        df = pd.DataFrame()
-        for row in rows:
-            # Skip these events because they won't exist in the api data
-            if row[4].text.strip() == "PGSTR" or row[4].text.strip()=="PGEND" or row[4].text.strip()=="ANTHEM" or row[4].text.strip() == "Event":
+    # Finished games never change, so their report can be cached
+    is_final = 'game_state' in pbp_df.columns and pbp_df.iloc[0]['game_state'] in FINAL_GAME_STATES
+    html_doc = fetch_text(html_report_url(season,pbp_df.iloc[0]['game_id']),"HTML Report","html-report",pbp_df.iloc[0]['game_id'],final=is_final)
+    if html_doc is not None:
+        df = parse_html_report(html_doc,players_df)
+        pbp_df = merge_html_report(pbp_df,df)
+    return pbp_df
+
+# Function to turn the html report into a df that's ready to be merged onto the api pbp
+@timed_stage
+def parse_html_report(html_doc,players_df):
+    return clean_html_report(parse_report(html_doc),players_df)
+
+# Function to get a parsed report df (see html_report.py) ready to be merged onto the api pbp
+def clean_html_report(df,players_df):
+    # Get the event owener from html report
+    df['event_primary_player'] = extract_event_primary_players(df['event'],df['description'],build_player_index(players_df))
+    df = add_elapsed_time(df)
+    # We need to map the html pbp events to their corresponding api pbp event for joining purposes. Also need to re-assign a few events
+    events_map = {"FAC":"faceoff",'SHOT':"shot-on-goal",'BLOCK':'blocked-shot','STOP':'stoppage','MISS':'missed-shot','HIT':'hit','TAKE':'takeaway','GIVE':"giveaway",
+                  'GOAL':'goal','PSTR':'period-start','PENL':"penalty",'PEND':"period-end",'DELPEN':"delayed-penalty",'GEND':"game-end",'SOC':'shootout-complete',
+                  "CHL":"stoppage",'EIEND':'stoppage','EISTR':'stoppage'}
+    df['event'] = df['event'].map(events_map)
+    for column in ['home_skater6','away_skater6','home_skater6_number','away_skater6_number']:
+        if column not in df.columns:
+            df[column] = np.nan
+    df=df.reset_index()
+    return df
+
+# Function to merge the parsed html report onto the api pbp. Events are lined up by align_events (see align.py).
+# Plays that don't line up with a report row are left out, unless keep_unmatched is True, in which case they're
+# kept with empty html columns. Either way they're counted in the metrics and handed to the metrics hooks.
+# A play the api sent twice (same eventId) is only kept once. Different plays that look the same (same second,
+# type and player) are all kept, each lined up with its own report row. Report rows whose event_num is in skip_html
+# aren't counted or handed to the hooks as unmatched, ex the ones a live game (see live.py) already reported
+@timed_stage
+def merge_html_report(pbp_df,df,keep_unmatched=False,skip_html=()):
+    pbp_df = rename_events(pbp_df)
+    pbp_df = pbp_df.drop_duplicates(subset=['eventId']).reset_index(drop=True)
+    alignment = align_events(pbp_df,df)
+    api_rows = alignment.api_rows
+    html_rows = alignment.html_rows
+    if keep_unmatched:
+        # -1 isn't a row in the report, so those plays get NaN html columns
+        api_rows = np.concatenate([api_rows,alignment.unmatched_api])
+        html_rows = np.concatenate([html_rows,np.full(len(alignment.unmatched_api),-1)])
+        order = np.argsort(api_rows,kind="stable")
+        api_rows = api_rows[order]
+        html_rows = html_rows[order]
+    # The api's values win for the columns both sides have (period, strength, times, event, player)
+    html_columns = [column for column in df.columns if column not in pbp_df.columns]
+    merged = pd.concat([pbp_df.iloc[api_rows].reset_index(drop=True),
+                        df[html_columns].reset_index(drop=True).reindex(html_rows).reset_index(drop=True)],axis=1)
+    report_unmatched(pbp_df,df,alignment,skip_html)
+    return merged
+
+# Function to add the player id of every on ice player (home_skater1_id...away_goalie_id), from the sweater numbers on
+# the html report and the rosterSpots. Ids are what OnIceIndex (see on_ice.py) is built from
+@timed_stage
+def add_on_ice_ids(pbp_df,players_df):
+    players = players_df.drop_duplicates(subset=['team','sweater_number'])
+    for side in ['home','away']:
+        # One team per side, so the lookup for each side is just sweater number -> id
+        team = pbp_df[side+'_team'].iloc[0] if len(pbp_df) else None
+        team_players = players[players['team']==team]
+        ids = pd.Series(team_players['player_id'].to_numpy(),index=team_players['sweater_number'].to_numpy())
+        for column in ON_ICE_COLUMNS:
+            if not column.startswith(side):
                 continue
-            else:
-                # Initial assignments. Addying try catch in case of some html error
-                try:
-                    event_num = row[0].text.strip()
-                    period = int(row[1].text.strip())
-                    strength = row[2].text.strip()
-                    time = row[3].text.strip()
-                    event = row[4].text.strip()
-                    description = row[5].text.strip()
-                    away_players = row[6].select("font")
-                    home_players = row[7].select("font")
-                except ValueError:
-                    print("Error assigning a variable from an html report row")
-                # Clean time because its formatted with elapsed/remaining combined. We will only use elapsed
-                period_time_elapsed = clean_time(time)
-                # Get the event owener from html report
-                event_primary_player = extract_event_primary_player(event,description,players_df)
-                if len(period_time_elapsed.split(":")[0])==1:
-                    period_time_elapsed = "0"+period_time_elapsed
-                d = {"event_num":event_num,"timeInPeriod":period_time_elapsed,"period":period,"strength":strength,'event':event,'description':description,'event_primary_player':event_primary_player}
-                d = add_players(d,away_players,'away')
-                d = add_players(d,home_players,'home')
-                temp = pd.DataFrame([d])
-                df = pd.concat([df,temp],ignore_index=True)
-        df = add_elapsed_time(df)
-        # We need to map the html pbp events to their corresponding api pbp event for joining purposes. Also need to re-assign a few events
-        events_map = {"FAC":"faceoff",'SHOT':"shot-on-goal",'BLOCK':'blocked-shot','STOP':'stoppage','MISS':'missed-shot','HIT':'hit','TAKE':'takeaway','GIVE':"giveaway",
-                      'GOAL':'goal','PSTR':'period-start','PENL':"penalty",'PEND':"period-end",'DELPEN':"delayed-penalty",'GEND':"game-end",'SOC':'shootout-complete',
-                      "CHL":"stoppage",'EIEND':'stoppage','EISTR':'stoppage'}
-        df['event'] = df['event'].map(events_map)
-        if 'home_skater6' not in df.columns:
-            df['home_skater6'] = np.nan
-        if 'away_skater6' not in df.columns:
-            df['away_skater6'] = np.nan
-        df=df.reset_index()
-        pbp_df=pbp_df.rename(columns={"typeDescKey":"event"})
-        # We need to merge on these 3 things because:
-        # - game seconds isnt enough because there can be multiple events in 1 second
-        # - game and events arent enough because for penalties there can be multiple assigned in the same second
-        # - we finally land on including the event player to distingusih events 
-        pbp_df = pd.merge(pbp_df,df,on=['game_seconds_elapsed','event','event_primary_player'],how='inner')
-        pbp_df = pbp_df.drop_duplicates(subset=['description','game_seconds_elapsed','event_primary_player'])
-        pbp_df = pbp_df.drop(columns=["period_y",'strength_y','timeInPeriod_y', 'period_minutes_elapsed_y',  'game_minutes_elapsed_y', 'period_seconds_elapsed_y'])
-        pbp_df = pbp_df.rename(columns={"period_x":'period','strength_x':"strength",'timeInPeriod_x':"timeInPeriod",'period_minutes_elapsed_x':'period_minutes_elapsed',
-                                        'game_minutes_elapsed_x':'game_minutes_elapsed','period_seconds_elapsed_x':'period_seconds_elapsed'})
+            numbers = pbp_df[column+'_number'] if column+'_number' in pbp_df.columns else pd.Series(np.nan,index=pbp_df.index)
+            pbp_df[column+'_id'] = pd.to_numeric(numbers,errors='coerce').map(ids).astype("Int32")
     return pbp_df
 
-# Func to clean the time that is on the html report
-def clean_time(time):
-    # Time in the html report is formated weird when scraped so we need to fix. Its time remaining and time elapsed combined. Ex - 20:000:00
-    split_time = time.split(":")
-    time_elapsed = split_time[0] + ":" + split_time[1][:2]
-    return time_elapsed
-
-# Function to add players in the html df
-def add_players(event_dict,players_array,home_or_away):
-    for i in range(1,len(players_array)+1):
-        p = players_array[i-1]
-        player = p.get("title",'')
-        player_split_name = player.split(" - ")[1]
-        player_split_pos = player.split(" - ")[0]
-        if player_split_pos == "Goalie":
-            skater = "{}_goalie".format(home_or_away)
-        else:
-            skater = '{}_skater{}'.format(home_or_away,i)
-        event_dict[skater] = player_split_name
-    return event_dict
+# Function to give the api's event column its final name and values
+def rename_events(pbp_df):
+    # adding this here. The api recogized failed so attempts as their own event where as the html pbp does not. Making this simple change
+    pbp_df.loc[pbp_df['typeDescKey']=="failed-shot-attempt",'typeDescKey'] = "missed-shot"
+    return pbp_df.rename(columns={"typeDescKey":"event"})
+
+# Function to record how the html merge went, and pass the plays and report rows that didn't line up to the metrics hooks
+def report_unmatched(pbp_df,df,alignment,skip_html=()):
+    metrics = get_metrics()
+    unmatched_html = alignment.unmatched_html
+    if len(skip_html) and len(unmatched_html):
+        unmatched_html = unmatched_html[~df['event_num'].iloc[unmatched_html].isin(skip_html).to_numpy()]
+    metrics.increment("html_merge_api_rows_in", len(pbp_df))
+    metrics.increment("html_merge_html_rows_in", len(df))
+    metrics.increment("html_merge_rows_out", len(alignment.api_rows))
+    metrics.increment("html_merge_unmatched_api", len(alignment.unmatched_api))
+    metrics.increment("html_merge_unmatched_html", len(unmatched_html))
+    if len(alignment.unmatched_api) or len(unmatched_html):
+        api_columns = [column for column in ['sortOrder','period','timeInPeriod','event','event_primary_player'] if column in pbp_df.columns]
+        html_columns = [column for column in ['event_num','period','timeInPeriod','event','description'] if column in df.columns]
+        metrics.emit({"type": "unmatched_events", "game_id": pbp_df['game_id'].iloc[0] if 'game_id' in pbp_df.columns and len(pbp_df) else None,
+                      "api": pbp_df.iloc[alignment.unmatched_api][api_columns].to_dict("records"),
+                      "html": df.iloc[unmatched_html][html_columns].to_dict("records")})
 
 # Fucntion to add shootout logic. So when I made the original total score function I forgot shootout goals would be counted as goals on pbp
 # so we need this function to change shootout goals to a new event called shooutout-goals, and then calculate the new score.
-# This will be skipped if there was no shootout in the game
+# This will be skipped if there was no shootout in the game. It starts with the first shootout shot rather than waiting for
+# the shootout to be over, so a live game's plays (see live.py) get the same handling while the shootout is going.
+# Running it again on plays it already handled changes nothing
+@timed_stage
 def add_shootout_logic(pbp_df):
-    if "shootout-complete" in pbp_df['event'].value_counts().keys().tolist():
+    end_of_ot = pbp_df[(pbp_df['event']=="period-end")&(pbp_df['period']==4)]['home_score'].tolist()
+    if (pbp_df['strength_cat_rel']=="shootout-shot").any() and end_of_ot:
         # first, we have to adjust the score to not add up when a shootout goal is scored
-        score_end_of_reg = pbp_df[(pbp_df['event']=="period-end")&(pbp_df['period']==4)]['home_score'].tolist()[0]
+        score_end_of_reg = end_of_ot[0]
         pbp_df.loc[pbp_df['strength_cat_rel']=='shootout-shot','home_score'] = score_end_of_reg
         pbp_df.loc[pbp_df['strength_cat_rel']=='shootout-shot','away_score'] = score_end_of_reg
         # build logic
@@ -393,61 +554,14 @@ def add_shootout_logic(pbp_df):
     return pbp_df
 
 
-# Function to get the event player from an html report row
-def extract_event_primary_player(event,description,players_df):
-    description = description.replace('\xa0', ' ')
-    split_desc = description.split(" ")
-    # If any f these events p1 will be NaN. Make sure to add those other weird events.
-    # Adding in a try catch because sometimes the html pbp is strange when trying to live scrape
-    try:
-        if event in ['PGSTR','PGEND','ANTHEM','PSTR','GEND','STOP','PEND','DELPEN','SOC','CHL','EIEND','EISTR']:
-            name=np.nan
-        # These all look similar. TEAM NUBER LAST NAME
-        elif event in ['HIT','MISS','BLOCK',"PENL",'GOAL']:
-            team = split_desc[0]
-            if "Served" in description:
-                spl_des = description.split("By:")
-                num_str = spl_des[1]
-                num = num_str.split(" ")[1]
-            else:
-                num = split_desc[1]
-            num = int(num.replace("#",''))
-            name = players_df[(players_df['sweater_number']==num)&(players_df['team']==team)]['player'].tolist()[0]
-        # These are all simar to. # TEAM EVENT - NUMBER LASTNAME
-        elif event in ["GIVE","TAKE","SHOT"]:
-            team = split_desc[0]
-            num = split_desc[3]
-            num = int(num.replace("#",''))
-            name = players_df[(players_df['sweater_number']==num)&(players_df['team']==team)]['player'].tolist()[0]
-        elif event == "FAC":
-            team = split_desc[0]
-            if split_desc[5]==team:
-                num=split_desc[6]
-            else:
-                # Becasue joel erikson ek and the van riemsdyk exist
-                split_again = description.split("vs ")
-                split_again_2 = split_again[1].split(" ")[1]
-                num=split_again_2
-            num = int(num.replace("#",''))
-            name = players_df[(players_df['sweater_number']==num)&(players_df['team']==team)]['player'].tolist()[0]
-        else:
-            name = np.nan
-    except:
-        name=np.nan
-    return name
-
 # Function to clean the columns 
-def clean_columns(pbp_df):
+@timed_stage
+def clean_columns(pbp_df,columns=None):
     pbp_df = pbp_df.rename(columns={"situationCode":"situation_code","homeTeamDefendingSide":"home_team_def_side",
                                     "periodDescriptor.periodType":"period_type","details.xCoord":"x_coordinate",
                                     "details.yCoord":"y_coordinate","details.zoneCode":"zone","details.shotType":"shot_type",
-                                    "season":"game_season"})
+                                    "season":"game_season","event_primary_id":"event_primary_player_id",
+                                    "event_secondary_id":"event_secondary_player_id","event_tertiary_id":"event_tertiary_player_id"})
     
-    pbp_df = pbp_df[['game_id',"game_season",'game_date',"game_type","venue","home_team","away_team","home_coach","away_coach","period",
-                     'period_type',"period_minutes_elapsed","period_seconds_elapsed","game_minutes_elapsed","game_seconds_elapsed",
-                     "event","event_team",'shot_type',"description",'x_coordinate','y_coordinate','zone','is_shot_on_empty_net_rel',
-                     'home_team_def_side','home_score','away_score',"event_primary_player",'event_secondary_player','event_tertiary_player','situation_code',
-                     'home_skaters_on_ice','away_skaters_on_ice','home_goalie_on_ice','away_goalie_on_ice','strength','strength_rel',
-                     'strength_cat_rel','home_skater1', 'home_skater2','home_skater3', 'home_skater4', 'home_skater5','home_skater6',
-                     'home_goalie','away_skater1', 'away_skater2', 'away_skater3', 'away_skater4','away_skater5','away_skater6','away_goalie']]
-    return pbp_df
\ No newline at end of file
+    pbp_df = compact_dtypes(pbp_df[CLEAN_COLUMNS if columns is None else list(columns)])
+    return pbp_df
@@ -0,0 +1,124 @@
+############################################## on_ice.py ###############################################
+#                                                                                                      #
+#                                 Index of who was on the ice for every event, built from the player   #
+#                                 id columns (home_skater1_id...away_goalie_id). It's a sparse         #
+#                                 event x player matrix stored by player: each player's row positions, #
+#                                 sorted. "Events with X on ice" and with/without splits are then an   #
+#                                 array lookup instead of a scan of fourteen name columns.             #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from .dtypes import ON_ICE_COLUMNS, ON_ICE_ID_COLUMNS
+############################################# Config ###################################################
+# Events split by whether player and other were on the ice: both of them, player without other, and other without player
+WithWithout = namedtuple("WithWithout", ["together", "player_only", "other_only"])
+
+class OnIceIndex:
+    # player_ids are the players' ids, sorted. Rows of player_ids[i] are rows[indptr[i]:indptr[i + 1]], as
+    # positions in a df of n_rows rows
+    def __init__(self, player_ids, indptr, rows, n_rows):
+        self.player_ids = player_ids
+        self.indptr = indptr
+        self.rows = rows
+        self.n_rows = n_rows
+
+    # Function to build the index for a df with the on ice id columns, ex from scrape_season or ParquetStore.read.
+    # Queries give row positions in this df, so keep using the same df (or one in the same order)
+    @classmethod
+    def from_frame(cls, pbp_df):
+        missing = [column for column in ON_ICE_ID_COLUMNS if column not in pbp_df.columns]
+        if missing:
+            raise ValueError("Missing on ice id columns: {}".format(", ".join(missing)))
+        ids = pbp_df[ON_ICE_ID_COLUMNS].to_numpy(dtype="int64", na_value=-1).ravel()
+        # Row position of every cell, in the same (row by row) order as ids
+        positions = np.repeat(np.arange(len(pbp_df), dtype=np.int32), len(ON_ICE_ID_COLUMNS))
+        filled = ids >= 0
+        ids = ids[filled]
+        positions = positions[filled]
+        # Sorting small player numbers instead of the ids themselves is a lot quicker. Stable, so each player's
+        # rows stay in order
+        codes, player_ids = pd.factorize(ids, sort=True)
+        order = np.argsort(codes.astype(np.int16 if len(player_ids) < 2 ** 15 else np.int32), kind="stable")
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(player_ids)))])
+        return cls(player_ids, indptr, positions[order], len(pbp_df))
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def __contains__(self, player_id):
+        return self.position(player_id) is not None
+
+    # Function to get where a player is in player_ids, or None if they were never on the ice
+    def position(self, player_id):
+        i = np.searchsorted(self.player_ids, player_id)
+        if i < len(self.player_ids) and self.player_ids[i] == player_id:
+            return i
+        return None
+
+    # Function to get the sorted row positions of the events a player was on the ice for
+    def player_rows(self, player_id):
+        i = self.position(player_id)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        return self.rows[self.indptr[i]:self.indptr[i + 1]]
+
+    # Function to get a boolean mask of the events where player_ids were on the ice. how="all" needs every one of
+    # them, how="any" at least one. Events with any of the without players on the ice are left out
+    def mask(self, player_ids, how="all", without=None):
+        if how not in ("all", "any"):
+            raise ValueError("how has to be 'all' or 'any', not {!r}".format(how))
+        player_ids = [player_ids] if np.isscalar(player_ids) else list(player_ids)
+        counts = np.zeros(self.n_rows, dtype=np.int16)
+        # A player is only in a row once, so the count is how many of them were on the ice
+        for player_id in set(player_ids):
+            counts[self.player_rows(player_id)] += 1
+        mask = counts == len(set(player_ids)) if how == "all" else counts > 0
+        if without is not None:
+            without = [without] if np.isscalar(without) else list(without)
+            for player_id in without:
+                mask[self.player_rows(player_id)] = False
+        return mask
+
+    # Function to get the events of pbp_df (the df the index was built from) where player_ids were on the ice. Same
+    # arguments as mask
+    def on_ice(self, pbp_df, player_ids, how="all", without=None):
+        self.check_frame(pbp_df)
+        return pbp_df[self.mask(player_ids, how, without)]
+
+    # Function to split a player's and another player's events by who was on the ice, ex a player with and without
+    # their defense partner. Returns a WithWithout of dfs
+    def with_without(self, pbp_df, player_id, other_id):
+        self.check_frame(pbp_df)
+        player = self.mask(player_id)
+        other = self.mask(other_id)
+        return WithWithout(pbp_df[player & other], pbp_df[player & ~other], pbp_df[other & ~player])
+
+    # Function to get how many events each player was on the ice for, as a Series indexed by player id
+    def counts(self):
+        return pd.Series(np.diff(self.indptr), index=self.player_ids, name="events")
+
+    # Function to get the index as a scipy.sparse csc_matrix (events x players, columns in player_ids order)
+    def to_sparse(self):
+        try:
+            from scipy import sparse
+        except ImportError:
+            raise ImportError("to_sparse needs scipy. Install it with pip install scipy")
+        data = np.ones(len(self.rows), dtype=np.int8)
+        return sparse.csc_matrix((data, self.rows, self.indptr), shape=(self.n_rows, len(self.player_ids)))
+
+    def check_frame(self, pbp_df):
+        if len(pbp_df) != self.n_rows:
+            raise ValueError("The index was built from {} rows, this df has {}".format(self.n_rows, len(pbp_df)))
+
+# Function to find the ids that go with a player's name (as it's written in the on ice columns, ex "AUSTON MATTHEWS").
+# Usually one id, but two players can share a name
+def find_player_ids(pbp_df, name):
+    ids = set()
+    for column in ON_ICE_COLUMNS:
+        matches = pbp_df.loc[pbp_df[column] == name, column + "_id"].dropna()
+        ids.update(int(player_id) for player_id in matches.unique())
+    return sorted(ids)
@@ -0,0 +1,109 @@
+############################################# pipeline.py ##############################################
+#                                                                                                      #
+#                                 Two stage fetch -> parse pipeline. Fetching is mostly waiting on     #
+#                                 the network, so it runs in threads. Parsing and cleaning is CPU      #
+#                                 bound, so it runs in a process pool to get around the GIL. The       #
+#                                 stages are joined by a bounded queue, so fetching can only get a     #
+#                                 few games ahead of parsing.                                          #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+############################################# Config ###################################################
+# Put on the queue by the fetch stage when it runs out of games
+DONE = object()
+# Yielded in place of a game that couldn't be fetched. error says why: DOWNLOAD_FAILED if fetch returned None, or
+# the exception fetch raised
+FailedGame = namedtuple("FailedGame", ["game_id", "error"])
+DOWNLOAD_FAILED = "download failed"
+# How the parse processes are started. Forking while the fetch threads hold locks (stdout, urllib3's pool, the cache)
+# can leave a worker deadlocked, so they come from a forkserver, or are spawned where there isn't one (Windows)
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Function to run a function over items in a thread pool, yielding results in the same order as the items.
+# Never has more than 2x workers items in flight, so results can't pile up if the caller is slow
+def map_in_threads(function, items, workers=1):
+    if workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Function to run games through the pipeline. fetch(game_id) returns a game's raw payloads (or None if it failed),
+# which get handed to parse(payloads) in another process. Yields parse's results in the order the games were given,
+# with a FailedGame for each game fetch returned None for or raised on, so no game goes missing without a trace.
+# Anything else that goes wrong in the fetch stage is raised here. parse has to be a top level function so it can be
+# sent to the worker processes
+def iter_pipeline(games, fetch, parse, fetch_workers=8, parse_workers=None, queue_size=None):
+    parse_workers = parse_workers or os.cpu_count() or 1
+    queue_size = queue_size or parse_workers * 2
+    payload_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    # Function to fetch one game, turning a failure into a FailedGame so the rest of the games still go through
+    def fetch_one(game_id):
+        try:
+            payloads = fetch(game_id)
+        except Exception as error:
+            return FailedGame(game_id, error)
+        return FailedGame(game_id, DOWNLOAD_FAILED) if payloads is None else payloads
+
+    # Fetch stage. Runs in its own thread and blocks when the queue is full. An error here is handed to the
+    # consumer to raise, since a thread's exception would only be printed
+    def fetch_games():
+        try:
+            for payloads in map_in_threads(fetch_one, games, fetch_workers):
+                if not put(payloads):
+                    return
+        except Exception as error:
+            put(error)
+        finally:
+            put(DONE)
+
+    # Function to put on the queue, giving up if the consumer has gone away
+    def put(item):
+        while not stop.is_set():
+            try:
+                payload_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    fetcher = threading.Thread(target=fetch_games, daemon=True)
+    fetcher.start()
+    try:
+        with ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context(START_METHOD)) as executor:
+            pending = deque()
+            fetching = True
+            while fetching or pending:
+                # Keep every process busy, plus one game each waiting
+                while fetching and len(pending) < parse_workers * 2:
+                    payloads = payload_queue.get()
+                    if payloads is DONE:
+                        fetching = False
+                    elif isinstance(payloads, Exception):
+                        raise payloads
+                    elif isinstance(payloads, FailedGame):
+                        # Kept in line with the parsed games, so results stay in order
+                        pending.append(payloads)
+                    else:
+                        pending.append(executor.submit(parse, payloads))
+                if pending:
+                    result = pending.popleft()
+                    yield result if isinstance(result, FailedGame) else result.result()
+    finally:
+        stop.set()
@@ -0,0 +1,108 @@
+############################################# schedule.py ##############################################
+#                                                                                                      #
+#                                 Game ID lookups from the NHL schedule endpoint. Every schedule       #
+#                                 response covers a full week, so ranges and seasons are walked        #
+#                                 one week per request instead of one day per request.                 #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import datetime
+from .http_client import get_url, api_url
+from .cache import FINAL_GAME_STATES
+############################################# Config ###################################################
+# Game types. 1 = Pre-season, 2 = Regular season, 3 = Playoffs
+REGULAR_AND_PLAYOFFS = (2, 3)
+
+# Raised when some schedule weeks couldn't be fetched, so the game ids would have holes. weeks has the start date
+# of each week that failed
+class ScheduleError(RuntimeError):
+    def __init__(self, weeks):
+        super().__init__("Couldn't get the schedule for the week(s) starting {}".format(", ".join(weeks)))
+        self.weeks = weeks
+
+# Function to get the schedule week that starts on a given date. Returns the json, or None if the request failed
+def get_schedule_week(date):
+    # Example URL: https://api-web.nhle.com/v1/schedule/2023-11-30
+    req = get_url(api_url("schedule/{}".format(date)), "Schedule API")
+    if req is None:
+        return None
+    # Handle value-related issues, like a bad json body
+    try:
+        return req.json()
+    except ValueError as val_err:
+        print(f"Schedule API Value error occured: {val_err}")
+    return None
+
+# Function to get every game id between two dates (inclusive). Walks the schedule one week at a time. If any week
+# can't be fetched (even after retries) the rest are still walked, then a ScheduleError lists the ones that failed,
+# so a list with holes in it never gets used as if it were complete
+def get_game_ids(start, end, game_types=None, season=None, final_only=True):
+    start = to_date(start)
+    end = to_date(end)
+    game_ids = []
+    seen = set()
+    failed_weeks = []
+    date = start
+    while date <= end:
+        week = get_schedule_week(date.isoformat())
+        if week is None:
+            failed_weeks.append(date.isoformat())
+            date = date + datetime.timedelta(days=7)
+            continue
+        for day in week.get('gameWeek', []):
+            day_date = to_date(day['date'])
+            if day_date < start or day_date > end:
+                continue
+            for game in day['games']:
+                if game['id'] in seen:
+                    continue
+                if game_types is not None and game.get('gameType') not in game_types:
+                    continue
+                if season is not None and str(game.get('season')) != str(season):
+                    continue
+                if final_only and game.get('gameState') not in FINAL_GAME_STATES:
+                    continue
+                seen.add(game['id'])
+                game_ids.append(game['id'])
+        # The response tells us where the next week starts. Fall back to +7 days if it doesn't
+        next_date = week.get('nextStartDate')
+        next_date = to_date(next_date) if next_date else date + datetime.timedelta(days=7)
+        if next_date <= date:
+            next_date = date + datetime.timedelta(days=7)
+        date = next_date
+    if failed_weeks:
+        raise ScheduleError(failed_weeks)
+    return game_ids
+
+# Function to get every game id from a season. Season is formatted like the API, ex 20232024
+def get_season_game_ids(season, game_types=REGULAR_AND_PLAYOFFS, final_only=True):
+    start, end = get_season_dates(season, game_types)
+    return get_game_ids(start, end, game_types=game_types, season=season, final_only=final_only)
+
+# Function to get the first and last date we need to walk for a season. Every schedule response carries the
+# season's key dates, so we look at one week in December and read them from there
+def get_season_dates(season, game_types=REGULAR_AND_PLAYOFFS):
+    start_year = int(str(season)[:4])
+    # Default to a window that covers a normal season, in case the key dates aren't there
+    start = datetime.date(start_year, 9, 1)
+    end = datetime.date(start_year + 1, 6, 30)
+    week = get_schedule_week("{}-12-01".format(start_year))
+    if week is not None and week.get('regularSeasonStartDate') and week.get('regularSeasonEndDate'):
+        if 1 in game_types and week.get('preSeasonStartDate'):
+            start = to_date(week['preSeasonStartDate'])
+        else:
+            start = to_date(week['regularSeasonStartDate'])
+        if 3 in game_types and week.get('playoffEndDate'):
+            end = to_date(week['playoffEndDate'])
+        else:
+            end = to_date(week['regularSeasonEndDate'])
+    return start, end
+
+# Function to turn a "YYYY-MM-DD" string (or a date) into a date
+def to_date(date):
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    if isinstance(date, datetime.date):
+        return date
+    return datetime.date.fromisoformat(str(date)[:10])
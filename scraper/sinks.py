@@ -0,0 +1,51 @@
+################################################ sinks.py ##############################################
+#                                                                                                      #
+#                                 Places to send scraped games as they stream out of iter_games.       #
+#                                 A sink has a write(pbp_df) function that gets called once per game   #
+#                                 (or batch of games), and a close() function for when we are done.    #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import os
+from .storage import ParquetStore
+############################################# Config ###################################################
+
+# Sink that appends every game to one csv file. The header is written with the first game
+class CsvSink:
+    def __init__(self, path):
+        self.path = path
+        self.wrote_header = False
+
+    def write(self, pbp_df):
+        if len(pbp_df) == 0:
+            return
+        # Start the file over on the first write, then keep appending
+        mode = "a" if self.wrote_header else "w"
+        pbp_df.to_csv(self.path, mode=mode, header=not self.wrote_header, index=False)
+        self.wrote_header = True
+
+    def close(self):
+        pass
+
+# Sink that writes every game to a ParquetStore. Takes a store or the folder to build one in
+class ParquetSink:
+    def __init__(self, store):
+        self.store = store if isinstance(store, ParquetStore) else ParquetStore(os.fspath(store))
+
+    def write(self, pbp_df):
+        self.store.write(pbp_df)
+
+    def close(self):
+        pass
+
+# Sink that hands every game to a function
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, pbp_df):
+        self.callback(pbp_df)
+
+    def close(self):
+        pass
@@ -0,0 +1,125 @@
+############################################## storage.py ##############################################
+#                                                                                                      #
+#                                 Parquet dataset for scraped games. Each game is written to its own   #
+#                                 game_season=/game_type=/game_id= folder, and a manifest keeps        #
+#                                 track of which games are already stored so bulk scrapes can skip     #
+#                                 them. Reads push column and partition filters down to pyarrow.       #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import json
+import os
+import threading
+import pandas as pd
+from .dtypes import compact_dtypes
+############################################# Config ###################################################
+PARTITION_COLUMNS = ["game_season", "game_type", "game_id"]
+# The manifest starts with _ so pyarrow doesn't try to read it as part of the dataset
+MANIFEST_NAME = "_manifest.json"
+# Text columns from clean_columns. These are written as strings even when a game has them all NaN
+# (ex home_skater6), so every file in the dataset ends up with the same schema
+STRING_COLUMNS = ["game_date", "venue", "home_team", "away_team", "home_coach", "away_coach", "period_type", "event",
+                  "event_team", "shot_type", "description", "zone", "home_team_def_side", "event_primary_player",
+                  "event_secondary_player", "event_tertiary_player", "situation_code", "strength", "strength_rel",
+                  "strength_cat_rel", "home_skater1", "home_skater2", "home_skater3", "home_skater4", "home_skater5",
+                  "home_skater6", "home_goalie", "away_skater1", "away_skater2", "away_skater3", "away_skater4",
+                  "away_skater5", "away_skater6", "away_goalie"]
+FLOAT_COLUMNS = ["period_minutes_elapsed", "game_minutes_elapsed", "x_coordinate", "y_coordinate", "is_shot_on_empty_net_rel"]
+
+class ParquetStore:
+    # root is the folder the dataset lives in. It gets created if it doesn't exist
+    def __init__(self, root):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("ParquetStore needs pyarrow. Install it with pip install pyarrow")
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self.load_manifest()
+
+    # Function to load the manifest. game id (as a string, since it's json) -> info about the stored game
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    # Function to save the manifest. Call with the lock held
+    def save_manifest(self):
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_path, self.manifest_path)
+
+    # Function to check if a game is already stored
+    def has_game(self, game_id):
+        return str(game_id) in self.manifest
+
+    # Function to get every stored game id
+    def game_ids(self):
+        return sorted(int(game_id) for game_id in self.manifest)
+
+    # Function to write the games in a clean_columns df. Games that are already stored are skipped unless
+    # overwrite is True. Returns the ids of the games that were written
+    def write(self, pbp_df, overwrite=False):
+        written = []
+        if pbp_df is None or len(pbp_df) == 0:
+            return written
+        for game_id, game_df in pbp_df.groupby('game_id', sort=False):
+            if self.has_game(game_id) and not overwrite:
+                continue
+            season = int(game_df['game_season'].iloc[0])
+            game_type = int(game_df['game_type'].iloc[0])
+            folder = os.path.join(self.root, "game_season={}".format(season), "game_type={}".format(game_type),
+                                  "game_id={}".format(game_id))
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, "part-0.parquet")
+            # Write to a hidden temp file first so readers never see half a file
+            temp_path = os.path.join(folder, ".part-0.parquet.tmp")
+            # Partition columns live in the folder names, not in the file
+            game_df = normalize_columns(game_df.drop(columns=PARTITION_COLUMNS))
+            game_df.to_parquet(temp_path, engine="pyarrow", index=False)
+            os.replace(temp_path, path)
+            with self.lock:
+                self.manifest[str(game_id)] = {"game_season": season, "game_type": game_type, "rows": len(game_df),
+                                               "path": os.path.relpath(path, self.root)}
+                self.save_manifest()
+            written.append(int(game_id))
+        return written
+
+    # Function to read games back. columns picks which columns to load, and seasons, game_types, game_ids and teams
+    # narrow down the games. Season, game type and game id filters only open the matching folders. filters can
+    # also be any pyarrow filter list, ex [('event', '==', 'goal')]
+    def read(self, columns=None, seasons=None, game_types=None, game_ids=None, teams=None, filters=None):
+        conditions = list(filters or [])
+        if seasons is not None:
+            conditions.append(("game_season", "in", [int(season) for season in seasons]))
+        if game_types is not None:
+            conditions.append(("game_type", "in", [int(game_type) for game_type in game_types]))
+        if game_ids is not None:
+            conditions.append(("game_id", "in", [int(game_id) for game_id in game_ids]))
+        if teams is not None:
+            # Home or away, so this becomes two sets of conditions that get or'ed
+            conditions = [conditions + [("home_team", "in", list(teams))], conditions + [("away_team", "in", list(teams))]]
+        if not self.manifest:
+            return pd.DataFrame(columns=columns)
+        pbp_df = pd.read_parquet(self.root, engine="pyarrow", columns=columns, filters=conditions or None)
+        # Partition columns come back as categories, turn them back into ints
+        for column in PARTITION_COLUMNS:
+            if column in pbp_df.columns:
+                pbp_df[column] = pbp_df[column].astype(int)
+        return compact_dtypes(pbp_df)
+
+# Function to give text and float columns a fixed type, so every game's file has the same schema
+def normalize_columns(pbp_df):
+    pbp_df = pbp_df.copy()
+    for column in STRING_COLUMNS:
+        if column in pbp_df.columns:
+            pbp_df[column] = pbp_df[column].astype("string")
+    for column in FLOAT_COLUMNS:
+        if column in pbp_df.columns:
+            pbp_df[column] = pbp_df[column].astype(float)
+    return pbp_df
@@ -0,0 +1,154 @@
+############################################## throttle.py #############################################
+#                                                                                                      #
+#                                 Request pacing for the NHL hosts. Each host gets a token bucket      #
+#                                 rate limit and a concurrency limit that halves when the host pushes  #
+#                                 back (429/5xx, dropped connections) and grows by one while it's      #
+#                                 healthy. Throttled requests are retried with exponential backoff,    #
+#                                 waiting as long as Retry-After asks when the host sends it.          #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import datetime
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+############################################# Config ###################################################
+# Statuses that mean "slow down / try again later"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Requests per second (and burst size) for each host. Hosts not listed use DEFAULT_RATE
+HOST_RATES = {"api-web.nhle.com": (10.0, 10), "www.nhl.com": (5.0, 5)}
+DEFAULT_RATE = (10.0, 10)
+MAX_RETRIES = 4
+# Backoff before retry n is about BACKOFF_BASE * 2^n seconds, capped at MAX_BACKOFF
+BACKOFF_BASE = 0.5
+MAX_BACKOFF = 30.0
+# Longest Retry-After we'll honor. Anything longer and the request is given up on
+MAX_RETRY_AFTER = 300.0
+START_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+
+# Rate limit. Holds up to burst tokens, refilled at rate per second. A rate of None means no limit
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Function to take a token, waiting for one if the bucket is empty
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Rate and concurrency limit for one host. The concurrency limit is additive increase / multiplicative decrease:
+# a throttled response halves it, and a limit's worth of healthy responses in a row raises it by one
+class HostLimiter:
+    def __init__(self, rate, burst=None, start_concurrency=START_CONCURRENCY, max_concurrency=MAX_CONCURRENCY, min_concurrency=1):
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = start_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.healthy_streak = 0
+        # When the host asks us to back off (Retry-After), nothing goes out to it until then
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+
+    # Function to wait for a free slot, any pause to end, and a token
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+        wait = self.paused_until - time.monotonic()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.paused_until - time.monotonic()
+        self.bucket.acquire()
+
+    # Function to give a slot back, with whether the host pushed back and for how long it asked us to wait. A wait
+    # over MAX_RETRY_AFTER isn't honored (the request is given up on, see RequestScheduler.backoff), so it doesn't
+    # hold up the host's other requests either
+    def release(self, throttled=False, retry_after=None):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_concurrency, self.limit // 2)
+                self.healthy_streak = 0
+                if retry_after and retry_after <= MAX_RETRY_AFTER:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            else:
+                self.healthy_streak += 1
+                if self.healthy_streak >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self.healthy_streak = 0
+            self.condition.notify_all()
+
+# Holds a HostLimiter per host, and the retry settings
+class RequestScheduler:
+    def __init__(self, host_rates=None, default_rate=DEFAULT_RATE, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+                 max_backoff=MAX_BACKOFF, start_concurrency=START_CONCURRENCY, max_concurrency=MAX_CONCURRENCY):
+        self.host_rates = dict(HOST_RATES if host_rates is None else host_rates)
+        self.default_rate = default_rate
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.start_concurrency = start_concurrency
+        self.max_concurrency = max_concurrency
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    # Function to get the limiter for a url's host (host:port, so local test servers get their own)
+    def limiter(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.limiters:
+                rate, burst = self.host_rates.get(urlsplit(url).hostname, self.default_rate)
+                self.limiters[host] = HostLimiter(rate, burst, min(self.start_concurrency, self.max_concurrency), self.max_concurrency)
+            return self.limiters[host]
+
+    # Function to get how long to wait before retry number attempt (0 based). Honors the response's Retry-After,
+    # and returns None if that asks for longer than MAX_RETRY_AFTER (not worth waiting for)
+    def backoff(self, attempt, response=None):
+        retry_after = get_retry_after(response)
+        if retry_after is not None:
+            return retry_after if retry_after <= MAX_RETRY_AFTER else None
+        delay = min(self.max_backoff, self.backoff_base * 2 ** attempt)
+        # Jitter, so threads that were throttled together don't all come back together
+        return delay / 2 + random.uniform(0, delay / 2)
+
+# Function to check if a response (None if the request never got one) means we should back off and try again
+def is_throttled(response):
+    return response is None or response.status_code in RETRY_STATUSES
+
+# Function to read a response's Retry-After header in seconds. It can be a number of seconds or an HTTP date.
+# Returns None if there isn't one (or it's unreadable)
+def get_retry_after(response):
+    if response is None or not response.headers.get("Retry-After"):
+        return None
+    value = response.headers["Retry-After"].strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+        seconds = (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    return max(0.0, seconds)
@@ -0,0 +1,132 @@
+############################################# test_align.py ############################################
+#                                                                                                      #
+#                                 align_events and merge_html_report on small made up games, one for   #
+#                                 each case the alignment has to get right, and on the benchmark       #
+#                                 fixtures with their reports knocked about. Run with python -m pytest #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.fixtures import FIXTURES, replay
+from scraper.align import align_events
+from scraper import nhl_pbp_data_scraper as scraper
+############################################# Config ###################################################
+# Share of plays that still have to line up with the perturbed reports below
+MIN_MATCHED = 0.98
+
+# Function to make an events df from (period, game_seconds_elapsed, event, player) tuples, plus any extra columns
+def events(rows, **columns):
+    df = pd.DataFrame(rows, columns=['period', 'game_seconds_elapsed', 'event', 'event_primary_player'])
+    for name, values in columns.items():
+        df[name] = values
+    return df
+
+# Function to get the alignment as a list of (api row, html row) pairs
+def pairs(alignment):
+    return list(zip(alignment.api_rows.tolist(), alignment.html_rows.tolist()))
+
+def test_stacked_events_keep_their_own_rows():
+    # Two penalties to the same player in the same second, ex a minor and a misconduct. Each takes its own row, in order
+    api = events([(1, 114, "penalty", "MATTHEWS"), (1, 114, "penalty", "MATTHEWS"), (1, 114, "faceoff", "NYLANDER")])
+    html = events([(1, 114, "penalty", "MATTHEWS"), (1, 114, "penalty", "MATTHEWS"), (1, 114, "faceoff", "NYLANDER")])
+    alignment = align_events(api, html)
+    assert pairs(alignment) == [(0, 0), (1, 1), (2, 2)]
+    assert len(alignment.unmatched_api) == 0 and len(alignment.unmatched_html) == 0
+
+def test_stacked_events_pair_by_player_first():
+    # Same second and type, different players, in a different order on each side
+    api = events([(1, 300, "hit", "RIELLY"), (1, 300, "hit", "TAVARES")])
+    html = events([(1, 300, "hit", "TAVARES"), (1, 300, "hit", "RIELLY")])
+    assert pairs(align_events(api, html)) == [(0, 1), (1, 0)]
+
+def test_missing_html_owner_matches_on_event_type():
+    # The owner couldn't be read off the report row, so it matches on the event type alone
+    api = events([(2, 1500, "takeaway", "MARNER"), (2, 1500, "shot-on-goal", "KNIES")])
+    html = events([(2, 1500, "shot-on-goal", "KNIES"), (2, 1500, "takeaway", None)])
+    alignment = align_events(api, html)
+    assert pairs(alignment) == [(0, 1), (1, 0)]
+    assert len(alignment.unmatched_api) == 0
+
+def test_period_end_and_next_period_start_stay_apart():
+    # 20:00 of the 1st and 0:00 of the 2nd are both 1200 game seconds. The stoppage at the end of the 1st isn't on
+    # the report, and mustn't take the one at the start of the 2nd
+    api = events([(1, 1200, "stoppage", None), (1, 1200, "period-end", None), (2, 1200, "period-start", None), (2, 1200, "stoppage", None)])
+    html = events([(1, 1200, "period-end", None), (2, 1200, "period-start", None), (2, 1200, "stoppage", None)])
+    alignment = align_events(api, html)
+    assert pairs(alignment) == [(1, 0), (2, 1), (3, 2)]
+    assert alignment.unmatched_api.tolist() == [0]
+
+def test_tolerance_pass():
+    # The report is a second off on the shot, and two seconds off on the hit
+    api = events([(1, 100, "shot-on-goal", "MATTHEWS"), (1, 200, "hit", "REAVES")])
+    html = events([(1, 101, "shot-on-goal", "MATTHEWS"), (1, 202, "hit", "REAVES")])
+    alignment = align_events(api, html)
+    assert pairs(alignment) == [(0, 0)]
+    assert alignment.unmatched_api.tolist() == [1]
+    assert alignment.unmatched_html.tolist() == [1]
+    # Turned off, neither lines up
+    assert pairs(align_events(api, html, tolerance=0)) == []
+
+def test_tolerance_needs_the_same_player_and_period():
+    api = events([(1, 100, "shot-on-goal", "MATTHEWS"), (2, 1200, "faceoff", "TAVARES")])
+    html = events([(1, 101, "shot-on-goal", "MARNER"), (1, 1199, "faceoff", "TAVARES")])
+    assert pairs(align_events(api, html)) == []
+
+def test_merge_keep_unmatched():
+    pbp = events([(1, 10, "faceoff", "TAVARES"), (1, 20, "hit", "REAVES"), (1, 30, "shot-on-goal", "MATTHEWS")],
+                 eventId=[1, 2, 3], sortOrder=[10, 20, 30], game_id=2023020001)
+    pbp = pbp.rename(columns={"event": "typeDescKey"})
+    html = events([(1, 10, "faceoff", "TAVARES"), (1, 30, "shot-on-goal", "MATTHEWS")],
+                  event_num=["1", "2"], description=["TOR won Off. Zone", "TOR ONGOAL - #34 MATTHEWS, Wrist"])
+    merged = scraper.merge_html_report(pbp.copy(), html)
+    assert merged['eventId'].tolist() == [1, 3]
+    merged = scraper.merge_html_report(pbp.copy(), html, keep_unmatched=True)
+    # The hit isn't on the report, so it's kept in order with empty html columns
+    assert merged['eventId'].tolist() == [1, 2, 3]
+    assert merged['description'].isna().tolist() == [False, True, False]
+    assert merged.loc[2, 'description'] == "TOR ONGOAL - #34 MATTHEWS, Wrist"
+
+def test_merge_drops_repeated_plays():
+    # The api sent the same play twice (same eventId). It's kept once
+    pbp = events([(1, 50, "giveaway", "RIELLY"), (1, 50, "giveaway", "RIELLY")], eventId=[7, 7], sortOrder=[70, 70], game_id=2023020001)
+    pbp = pbp.rename(columns={"event": "typeDescKey"})
+    html = events([(1, 50, "giveaway", "RIELLY")], event_num=["9"], description=["TOR GIVEAWAY - #44 RIELLY, Def. Zone"])
+    merged = scraper.merge_html_report(pbp, html)
+    assert merged['eventId'].tolist() == [7]
+
+# Function to scrape a fixture game, returning the eventId and description of every play that lined up. perturb, if
+# given, changes the parsed report before it's merged
+def merged_plays(monkeypatch, game_id, perturb=None):
+    parse_html_report, merge_html_report = scraper.parse_html_report, scraper.merge_html_report
+    merges = []
+    if perturb is not None:
+        monkeypatch.setattr(scraper, "parse_html_report", lambda html_doc, players_df: perturb(parse_html_report(html_doc, players_df)))
+    monkeypatch.setattr(scraper, "merge_html_report", lambda *args, **kwargs: merges.append(merge_html_report(*args, **kwargs)) or merges[-1])
+    with replay([game_id]), contextlib.redirect_stdout(io.StringIO()):
+        scraper.scrape_game(game_id)
+    monkeypatch.undo()
+    return merges[0][['eventId', 'description']]
+
+# Function to knock a recorded report about: every 10th row a second late (within its period) and every 7th row's
+# owner unreadable
+def perturb(df):
+    rows = np.arange(len(df))
+    movable = ~df['event'].isin(['period-start', 'period-end', 'game-end']) & (df['period_seconds_elapsed'] < 1199)
+    df.loc[movable & (rows % 10 == 3), 'game_seconds_elapsed'] += 1
+    df.loc[rows % 7 == 5, 'event_primary_player'] = None
+    return df
+
+@pytest.mark.parametrize("name", sorted(FIXTURES))
+def test_perturbed_report(monkeypatch, name):
+    game_id = FIXTURES[name]["game_id"]
+    expected = merged_plays(monkeypatch, game_id)
+    perturbed = merged_plays(monkeypatch, game_id, perturb)
+    # Nearly every play still lines up, and none of them with another play's row
+    assert len(perturbed) >= MIN_MATCHED * len(expected)
+    joined = perturbed.merge(expected, on='eventId', how='left', suffixes=('', '_expected'))
+    assert (joined['description'] == joined['description_expected']).all()
@@ -0,0 +1,137 @@
+############################################# test_live.py #############################################
+#                                                                                                      #
+#                                 LiveGame against a recorded game served a few plays at a time, so    #
+#                                 the polls can be checked against a full scrape of the same game.     #
+#                                 Run with python -m pytest                                            #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import contextlib
+import io
+import json
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from benchmarks.fixtures import load_fixture, GAMECENTER_RE, HTML_REPORT_RE
+from scraper import http_client, metrics
+from scraper import nhl_pbp_data_scraper as scraper
+from scraper.live import LiveGame
+from scraper.throttle import RequestScheduler
+############################################# Config ###################################################
+GAME_ID = 2023020350
+SHOOTOUT_GAME_ID = 2023020412
+# The fixture's first penalty, at 1:54 of the 1st. The stacked game gets a second one at the same second
+PENALTY_SORT_ORDER = 150
+PENALTY_ROW = '<td align="center" class=" + bborder">18</td>'
+
+# Adapter that serves one game. Only the first `plays` plays are on the play-by-play (all of them when None), and
+# unchanged responses come back as a 304 like the real hosts
+class GameAdapter(BaseAdapter):
+    def __init__(self, bodies):
+        super().__init__()
+        self.bodies = bodies
+        self.game = json.loads(bodies["play-by-play"])
+        self.plays = None
+
+    def send(self, request, **kwargs):
+        if GAMECENTER_RE.search(request.url) and GAMECENTER_RE.search(request.url).group(2) == "play-by-play":
+            plays = self.game["plays"] if self.plays is None else self.game["plays"][:self.plays]
+            state = "OFF" if self.plays is None else "LIVE"
+            body = json.dumps(dict(self.game, plays=plays, gameState=state))
+        elif GAMECENTER_RE.search(request.url):
+            body = self.bodies["landing"]
+        elif HTML_REPORT_RE.search(request.url):
+            body = self.bodies["html-report"]
+        else:
+            body = None
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        etag = str(hash(body))
+        if body is None:
+            response.status_code = 404
+            response._content = b""
+        elif request.headers.get("If-None-Match") == etag:
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response._content = body.encode("utf-8")
+            response.headers["ETag"] = etag
+        return response
+
+    def close(self):
+        pass
+
+# Function to point the shared session at an adapter, with the cache and rate limits off and fresh metrics
+@contextlib.contextmanager
+def serve(adapter):
+    session = requests.Session()
+    session.mount("https://", adapter)
+    old_session, old_cache, old_scheduler, old_metrics = http_client.session, http_client.cache, http_client.scheduler, metrics.get_metrics()
+    http_client.set_session(session)
+    http_client.cache = None
+    http_client.set_scheduler(RequestScheduler(host_rates={}, default_rate=(None, None)))
+    metrics.set_metrics(metrics.Metrics())
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield adapter
+    finally:
+        http_client.set_session(old_session)
+        http_client.cache = old_cache
+        http_client.set_scheduler(old_scheduler)
+        metrics.set_metrics(old_metrics)
+
+# Function to add a second penalty to the same player in the same second as the game's first one. The api play and
+# the report row only differ in the penalty, so the two can only be told apart by which report row is still free
+def stacked_penalty_game():
+    bodies = load_fixture(GAME_ID)
+    game = json.loads(bodies["play-by-play"])
+    index = next(i for i, play in enumerate(game["plays"]) if play["sortOrder"] == PENALTY_SORT_ORDER)
+    second = json.loads(json.dumps(game["plays"][index]))
+    second.update(eventId=9001, sortOrder=PENALTY_SORT_ORDER + 1)
+    second["details"]["descKey"] = "roughing"
+    game["plays"].insert(index + 1, second)
+    html_doc = bodies["html-report"]
+    start = html_doc.index(PENALTY_ROW)
+    start = html_doc.rindex("<tr", 0, start)
+    end = html_doc.index('<tr class="', start + 1)
+    row = html_doc[start:end].replace(">18</td>", ">9001</td>", 1).replace("Hooking", "Roughing")
+    bodies["play-by-play"] = json.dumps(game)
+    bodies["html-report"] = html_doc[:end] + row + html_doc[end:]
+    return bodies, index + 1
+
+# Function to poll a game, with the play-by-play cut after each of the given play counts and then in full
+def poll_game(bodies, cuts):
+    with serve(GameAdapter(bodies)) as adapter:
+        game = LiveGame(int(json.loads(bodies["play-by-play"])["id"]))
+        for plays in list(cuts) + [None]:
+            adapter.plays = plays
+            game.poll()
+        return game.frame(), metrics.get_metrics().snapshot()["counters"]
+
+# Function to scrape the whole game in one go
+def scrape(bodies):
+    with serve(GameAdapter(bodies)):
+        return scraper.scrape_game(int(json.loads(bodies["play-by-play"])["id"])), metrics.get_metrics().snapshot()["counters"]
+
+def test_stacked_events_across_polls():
+    bodies, first_penalty = stacked_penalty_game()
+    # The first poll stops right after the first penalty, so the second one comes in on the next poll
+    live, _ = poll_game(bodies, [first_penalty])
+    full, _ = scrape(bodies)
+    penalties = live[(live['event'] == "penalty") & (live['game_seconds_elapsed'] == 114)]
+    assert penalties['description'].str.contains("Hooking").sum() == 1
+    assert penalties['description'].str.contains("Roughing").sum() == 1
+    assert live['description'].tolist() == full['description'].tolist()
+
+@pytest.mark.parametrize("game_id", [GAME_ID, SHOOTOUT_GAME_ID])
+def test_unmatched_rows_counted_once(game_id):
+    bodies = load_fixture(game_id)
+    plays = len(json.loads(bodies["play-by-play"])["plays"])
+    live, live_counters = poll_game(bodies, range(50, plays, 50))
+    full, full_counters = scrape(bodies)
+    assert len(live) == len(full)
+    assert live_counters.get("html_merge_unmatched_html", 0) == full_counters.get("html_merge_unmatched_html", 0)
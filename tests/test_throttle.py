@@ -0,0 +1,108 @@
+############################################ test_throttle.py ##########################################
+#                                                                                                      #
+#                                 Retries, backoff and concurrency limits against a fake NHL host: a   #
+#                                 local http.server that answers each path with a set list of          #
+#                                 statuses. Run with python -m pytest                                  #
+#                                                                                                      #
+########################################################################################################
+
+######################################### Import Modules ###############################################
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from scraper import http_client
+from scraper.throttle import RequestScheduler, START_CONCURRENCY
+############################################# Config ###################################################
+# Retry-After the fake host sends with its 429s, in seconds
+RETRY_AFTER = 0.5
+
+# Fake host. responses maps a path to the (status, headers) it answers with, one per request; the last one repeats.
+# hits counts the requests to each path
+class FakeHost(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.responses = {}
+        self.hits = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+class FakeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            hit = self.server.hits.get(self.path, 0)
+            self.server.hits[self.path] = hit + 1
+        responses = self.server.responses.get(self.path, [(404, {})])
+        status, headers = responses[min(hit, len(responses) - 1)]
+        body = json.dumps({"path": self.path}).encode() if status == 200 else b"{}"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def host():
+    server = FakeHost()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    old_api, old_scheduler = http_client.API_BASE_URL, http_client.scheduler
+    http_client.set_base_urls(api=server.url + "/v1")
+    # Short backoff so the 503 retries don't slow the tests down
+    http_client.set_scheduler(RequestScheduler(backoff_base=0.01, max_backoff=0.05))
+    yield server
+    http_client.set_base_urls(api=old_api)
+    http_client.set_scheduler(old_scheduler)
+    server.shutdown()
+    server.server_close()
+
+def test_429_waits_for_retry_after(host):
+    host.responses["/v1/throttled"] = [(429, {"Retry-After": str(RETRY_AFTER)}), (200, {})]
+    start = time.monotonic()
+    response = http_client.get_url(http_client.api_url("throttled"), "test")
+    assert response is not None and response.status_code == 200
+    assert host.hits["/v1/throttled"] == 2
+    assert time.monotonic() - start >= RETRY_AFTER
+
+def test_503_is_retried(host):
+    host.responses["/v1/unavailable"] = [(503, {}), (503, {}), (200, {})]
+    response = http_client.get_url(http_client.api_url("unavailable"), "test")
+    assert response is not None and response.json() == {"path": "/v1/unavailable"}
+    assert host.hits["/v1/unavailable"] == 3
+
+def test_long_retry_after_gives_up_without_pausing(host):
+    host.responses["/v1/closed"] = [(429, {"Retry-After": "3600"})]
+    assert http_client.get_url(http_client.api_url("closed"), "test") is None
+    assert host.hits["/v1/closed"] == 1
+    # The host's other requests don't wait an hour for a request that was given up on
+    assert http_client.scheduler.limiter(http_client.api_url("any")).paused_until <= time.monotonic()
+    host.responses["/v1/open"] = [(200, {})]
+    start = time.monotonic()
+    assert http_client.get_url(http_client.api_url("open"), "test") is not None
+    assert time.monotonic() - start < RETRY_AFTER
+
+def test_404_is_not_retried(host):
+    assert http_client.get_url(http_client.api_url("missing"), "test") is None
+    assert host.hits["/v1/missing"] == 1
+
+def test_gives_up_after_max_retries(host):
+    host.responses["/v1/down"] = [(503, {})]
+    assert http_client.get_url(http_client.api_url("down"), "test") is None
+    assert host.hits["/v1/down"] == http_client.scheduler.max_retries + 1
+
+def test_concurrency_drops_when_throttled(host):
+    limiter = http_client.scheduler.limiter(http_client.api_url("any"))
+    assert limiter.limit == START_CONCURRENCY
+    host.responses["/v1/busy"] = [(503, {}), (200, {})]
+    http_client.get_url(http_client.api_url("busy"), "test")
+    # Halved by the 503, and one healthy response isn't enough to grow it back
+    assert limiter.limit == START_CONCURRENCY // 2